@@ -9,7 +9,6 @@ from .decision_agent import DecisionAgent
 from .code_scanner import CodeScannerAgent
 
 __all__ = [
-    "ProjectAnalyzer",
     "EnvironmentBuilder",
     "EnvironmentFixer",
     "DecisionAgent",
@@ -5,22 +5,64 @@ Now supports .py and .ipynb files.
 """
 
 import ast
+import hashlib
 import json
 import logging
+import mmap
+import os
+import re
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 from pathlib import Path
-from typing import List, Set, Tuple, Optional
+from typing import Any, FrozenSet, Iterable, List, Set, Tuple, Optional, Union
+
+from config.settings import settings
+
+# orjson is optional: notebooks can be multi-MB JSON documents, and it parses
+# bytes directly (no decode step) several times faster than the stdlib.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
 
 logger = logging.getLogger(__name__)
 
+SOURCE_SUFFIXES = ('.py', '.ipynb')
+
+# Config files whose raw content is passed along as hints in the summary
+CONFIG_HINT_FILES = frozenset({'requirements.txt', 'setup.py', 'pyproject.toml', 'Pipfile'})
+
+# Below this many source files the scan runs serially (pool startup dominates)
+PARALLEL_MIN_FILES = 16
+
+# Files larger than this are memory-mapped rather than read into memory
+MMAP_THRESHOLD_BYTES = 1 << 20
+
+# Bump whenever import extraction or CUDA detection changes, to invalidate cached scans
+AST_CACHE_VERSION = 4
+
+# GPU/CUDA usage heuristics, compiled once for raw file bytes and for notebook code text
+_CUDA_KEYWORDS = r'cuda|gpu|torch\.device|tensorflow-gpu'
+_CUDA_BYTES_RE = re.compile(_CUDA_KEYWORDS.encode(), re.IGNORECASE)
+_CUDA_TEXT_RE = re.compile(_CUDA_KEYWORDS, re.IGNORECASE)
+
+# Line-level import matcher for notebook code (absolute imports only; 'import' captures the rest of the line)
+_IMPORT_LINE_RE = re.compile(r'^[ \t]*(?:from[ \t]+([A-Za-z_][\w.]*)[ \t]+import\b|import[ \t]+([^\n#;]+))', re.MULTILINE)
+
 class CodeScannerAgent:
     """
     Analyzes source code to extract import statements and detect CUDA usage.
     """
 
-    # Expanded Standard Library List (Python 3.8+)
-    # These should NOT appear in requirements.txt
-    STD_LIB = set(sys.builtin_module_names) | {
+    # Standard Library modules - these should NOT appear in requirements.txt
+    # Python 3.10+ ships the authoritative list (sys.stdlib_module_names);
+    # the explicit set below covers older interpreters.
+    STD_LIB = frozenset(getattr(sys, 'stdlib_module_names', ())) | frozenset(sys.builtin_module_names) | frozenset({
         'abc', 'argparse', 'ast', 'asyncio', 'base64', 'collections', 'copy', 'csv',
         'datetime', 'decimal', 'distutils', 'email', 'enum', 'functools', 'glob',
         'gzip', 'hashlib', 'html', 'http', 'importlib', 'inspect', 'io', 'json',
@@ -28,16 +70,22 @@ class CodeScannerAgent:
         'pprint', 'random', 're', 'shutil', 'signal', 'socket', 'sqlite3', 'ssl',
         'stat', 'string', 'subprocess', 'sys', 'tempfile', 'threading', 'time',
         'timeit', 'typing', 'unittest', 'urllib', 'uuid', 'warnings', 'weakref',
-        'xml', 'zipfile', 'zoneinfo'
-    }
+        'xml', 'zipfile', 'zoneinfo', 'bisect', 'codecs', 'concurrent', 'configparser',
+        'contextlib', 'contextvars', 'ctypes', 'dataclasses', 'fnmatch', 'fractions',
+        'getpass', 'heapq', 'mimetypes', 'numbers', 'operator', 'queue', 'secrets',
+        'shlex', 'statistics', 'struct', 'textwrap', 'tomllib', 'traceback', 'types'
+    })
 
     def __init__(self, output_dir: str):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        # Kept in the user cache home: the output dir may sit inside the (untrusted) repo being scanned
+        self.cache_dir = settings.llm_cache_dir.parent / "ast"
 
     def scan_files(self, file_paths: List[Path], root_dir: Path, project_name: str) -> Path:
         """
         Main entry point: Scans a list of files for dependencies.
+        Source files are parsed in a process pool; config hints are read on the main thread.
         """
         all_imports = set()
         cuda_required = False
@@ -45,25 +93,27 @@ class CodeScannerAgent:
 
         logger.info(f"🔬 Static Analysis: Scanning {len(file_paths)} files in {root_dir.name}...")
 
+        # 1. Analyze Source Code (.py & .ipynb)
+        source_files = [p for p in file_paths if p.suffix in SOURCE_SUFFIXES]
+        for imports, has_cuda in self._map_source_files(source_files):
+            all_imports.update(imports)
+            if has_cuda:
+                cuda_required = True
+
+        # 2. Collect Config Hints (requirements.txt, etc.)
+        # These are just read as text to provide context for GPT-4 later
         for file_path in file_paths:
-            try:
-                # 1. Analyze Source Code (.py & .ipynb)
-                if file_path.suffix in ['.py', '.ipynb']:
-                    imports, has_cuda = self._scan_source_file(file_path)
-                    all_imports.update(imports)
-                    if has_cuda:
-                        cuda_required = True
-                
-                # 2. Collect Config Hints (requirements.txt, etc.)
-                # These are just read as text to provide context for GPT-4 later
-                if file_path.name in ['requirements.txt', 'setup.py', 'pyproject.toml', 'Pipfile']:
-                    content = self._read_file_safe(file_path)
-                    if content:
-                        hint_block = f"--- Content of {file_path.name} ---\n{content[:3000]}\n"
-                        dependency_hints.append(hint_block)
-
-            except Exception as e:
-                logger.warning(f"Failed to scan {file_path.name}: {e}")
+            if file_path.name in CONFIG_HINT_FILES:
+                try:
+                    data = _read_file_safe(file_path)
+                    if data:
+                        # Hints stay as raw bytes end-to-end; the summary is written as bytes
+                        header = f"--- Content of {file_path.name} ---\n".encode('utf-8')
+                        dependency_hints.append(header + data[:3000] + b"\n")
+                    if isinstance(data, mmap.mmap):
+                        data.close()
+                except Exception as e:
+                    logger.warning(f"Failed to scan {file_path.name}: {e}")
 
         # 3. Generate Summary Report
         summary_filename = f"dependency_summary_{project_name}.txt"
@@ -73,94 +123,23 @@ class CodeScannerAgent:
         
         return output_path
 
-    def _scan_source_file(self, file_path: Path) -> Tuple[Set[str], bool]:
-        """Dispatches to correct scanner based on file extension."""
-        if file_path.suffix == '.ipynb':
-            return self._scan_notebook(file_path)
-        return self._scan_python(file_path)
-
-    def _scan_python(self, file_path: Path) -> Tuple[Set[str], bool]:
-        """Extract imports from .py file using AST."""
-        imports = set()
-        has_cuda = False
-        
-        content = self._read_file_safe(file_path)
-        if not content:
-            return imports, has_cuda
-
-        # Simple string check for CUDA usage
-        if self._check_cuda_usage(content):
-            has_cuda = True
-
-        # AST Parsing
-        try:
-            tree = ast.parse(content)
-            imports.update(self._extract_imports_from_ast(tree))
-        except SyntaxError:
-            logger.debug(f"Syntax error in {file_path.name} (skipping AST)")
-        except Exception:
-            pass
-            
-        return imports, has_cuda
-
-    def _scan_notebook(self, file_path: Path) -> Tuple[Set[str], bool]:
-        """Extract imports from .ipynb file (Jupyter Notebook)."""
-        imports = set()
-        has_cuda = False
-        
-        content = self._read_file_safe(file_path)
-        if not content:
-            return imports, has_cuda
+    def _map_source_files(self, source_files: List[Path]) -> Iterable[Tuple[FrozenSet[str], bool]]:
+        """
+        Runs _scan_source_file over all source files.
+        Small batches stay serial: spawning workers costs more than parsing a handful of files.
+        """
+        scan = partial(_scan_source_file, cache_dir=self.cache_dir)
+        if len(source_files) < PARALLEL_MIN_FILES:
+            return map(scan, source_files)
 
         try:
-            notebook = json.loads(content)
-            # Combine all code cells into one string
-            code_content = ""
-            for cell in notebook.get('cells', []):
-                if cell.get('cell_type') == 'code':
-                    code_content += "".join(cell.get('source', [])) + "\n"
-            
-            if self._check_cuda_usage(code_content):
-                has_cuda = True
-                
-            # Parse the combined code
-            tree = ast.parse(code_content)
-            imports.update(self._extract_imports_from_ast(tree))
-            
-        except Exception:
-            # Notebooks often have magic commands (%) that break AST
-            # In a real product, we would clean them, but here we just skip if it fails
-            pass
-            
-        return imports, has_cuda
-
-    def _extract_imports_from_ast(self, tree: ast.AST) -> Set[str]:
-        """Helper to walk AST and find import nodes."""
-        found = set()
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for name in node.names:
-                    found.add(name.name.split('.')[0])
-            elif isinstance(node, ast.ImportFrom):
-                if node.module:
-                    # e.g., 'from sklearn.metrics import ...' -> 'sklearn'
-                    found.add(node.module.split('.')[0])
-        return found
-
-    def _check_cuda_usage(self, content: str) -> bool:
-        """Heuristic check for GPU/CUDA usage."""
-        lower = content.lower()
-        keywords = ['cuda', 'gpu', 'torch.device', 'tensorflow-gpu']
-        return any(k in lower for k in keywords)
-
-    def _read_file_safe(self, path: Path) -> str:
-        try:
-            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-        except:
-            return ""
+            with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_scan_worker) as ex:
+                return list(ex.map(scan, source_files, chunksize=16))
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning(f"Process pool unavailable ({e}), scanning serially")
+            return map(scan, source_files)
 
-    def _write_summary(self, path: Path, imports: Set[str], cuda_required: bool, project_name: str, hints: List[str]):
+    def _write_summary(self, path: Path, imports: Set[str], cuda_required: bool, project_name: str, hints: List[bytes]):
         """Saves the analysis result to a text file for the next agent."""
         # Filter out standard library modules
         filtered_imports = sorted([
@@ -169,25 +148,241 @@ class CodeScannerAgent:
         ])
 
         lines = [
-            f"# Dependency Summary for {project_name}",
-            f"# Generated by EnvAgent CodeScanner",
-            "",
-            f"CUDA Required: {'Yes' if cuda_required else 'No'}",
-            "",
-            "## Detected Third-Party Imports (AST Analysis):",
+            f"# Dependency Summary for {project_name}".encode('utf-8'),
+            b"# Generated by EnvAgent CodeScanner",
+            b"",
+            b"CUDA Required: Yes" if cuda_required else b"CUDA Required: No",
+            b"",
+            b"## Detected Third-Party Imports (AST Analysis):",
         ]
         
         if filtered_imports:
-            lines.extend([f"- {imp}" for imp in filtered_imports])
+            lines.extend([f"- {imp}".encode('utf-8') for imp in filtered_imports])
         else:
-            lines.append("(No third-party imports detected)")
+            lines.append(b"(No third-party imports detected)")
             
-        lines.append("")
-        lines.append("## Configuration File Hints:")
+        lines.append(b"")
+        lines.append(b"## Configuration File Hints:")
         if hints:
             lines.extend(hints)
         else:
-            lines.append("(No configuration files found)")
+            lines.append(b"(No configuration files found)")
+
+        path.write_bytes(b"\n".join(lines))
+        logger.info(f"Summary saved to {path}")
+
+
+# ----------------------------------------------------------------
+# Worker functions (module-level so they pickle cheaply for the process pool)
+# ----------------------------------------------------------------
+def _init_scan_worker() -> None:
+    """Pool initializer: workers only parse source text, they never import it."""
+    sys.dont_write_bytecode = True
+
+
+def _scan_source_file(file_path: Path, cache_dir: Optional[Path] = None) -> Tuple[FrozenSet[str], bool]:
+    """
+    Dispatches to correct scanner based on file extension.
+    Results are cached on disk by content hash, so unchanged files skip parsing on re-scans.
+    Returns an immutable set of interned names, which is cheap to pickle back to the parent.
+    """
+    data = b""
+    try:
+        data = _read_file_safe(file_path)
+        if not data:
+            return frozenset(), False
+
+        cache_file = None
+        if cache_dir is not None:
+            # compile() verdicts (SyntaxError -> regex fallback) depend on the interpreter version
+            key = hashlib.sha256(data).hexdigest()
+            py_tag = "py{}{}".format(*sys.version_info[:2])
+            cache_file = cache_dir / key[:2] / f"{key}.{py_tag}.v{AST_CACHE_VERSION}.json"
+            cached = _load_cached_scan(cache_file)
+            if cached is not None:
+                return _freeze_result(cached)
+
+        if file_path.suffix == '.ipynb':
+            result = _scan_notebook(file_path, data)
+        else:
+            result = _scan_python(file_path, data)
+
+        result = _freeze_result(result)
+        if cache_file is not None:
+            _store_cached_scan(cache_file, result)
+        return result
+    except Exception as e:
+        logger.warning(f"Failed to scan {file_path.name}: {e}")
+        return frozenset(), False
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def _freeze_result(result: Tuple[Iterable[str], bool]) -> Tuple[FrozenSet[str], bool]:
+    imports, has_cuda = result
+    return frozenset(sys.intern(name) for name in imports), has_cuda
+
+
+def _load_cached_scan(cache_file: Path) -> Optional[Tuple[List[str], bool]]:
+    """Entries are plain JSON ({"imports": [...], "cuda": bool}); nothing in them is executed."""
+    try:
+        with open(cache_file, 'rb') as f:
+            entry = _json_loads(f.read())
+        imports, cuda = entry["imports"], entry["cuda"]
+    except Exception:
+        return None
+    if not isinstance(imports, list) or not all(isinstance(name, str) for name in imports) or not isinstance(cuda, bool):
+        return None
+    return imports, cuda
+
+
+def _store_cached_scan(cache_file: Path, result: Tuple[FrozenSet[str], bool]) -> None:
+    """Writes via a temp file + rename so concurrent workers never see a partial entry."""
+    imports, has_cuda = result
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"imports": sorted(imports), "cuda": has_cuda}, f)
+        os.replace(tmp_path, cache_file)
+    except Exception as e:
+        logger.debug(f"Could not write AST cache entry {cache_file.name}: {e}")
+
+
+def _scan_python(file_path: Path, data: Union[bytes, mmap.mmap]) -> Tuple[Set[str], bool]:
+    """Extract imports from .py file using AST."""
+    imports = set()
+    has_cuda = False
+
+    # Simple keyword check for CUDA usage
+    if _check_cuda_usage(data):
+        has_cuda = True
+
+    # AST Parsing
+    try:
+        tree = _parse_ast(data, file_path)
+        imports.update(_extract_imports_from_ast(tree))
+    except SyntaxError:
+        logger.debug(f"Syntax error in {file_path.name} (skipping AST)")
+    except Exception:
+        pass
+        
+    return imports, has_cuda
+
+
+def _scan_notebook(file_path: Path, data: Union[bytes, mmap.mmap]) -> Tuple[Set[str], bool]:
+    """Extract imports from .ipynb file (Jupyter Notebook)."""
+    imports = set()
+    has_cuda = False
+
+    try:
+        notebook = _load_json(data)
+        # Combine all code cells into one string (single join, no repeated concatenation)
+        parts = []
+        for cell in notebook.get('cells', []):
+            if cell.get('cell_type') == 'code':
+                source = cell.get('source', [])
+                # nbformat allows a cell source to be a single string or a list of lines
+                if isinstance(source, str):
+                    parts.append(source)
+                else:
+                    parts.extend(source)
+                parts.append("\n")
+        code_content = "".join(parts)
+        
+        if _check_cuda_usage(code_content):
+            has_cuda = True
+            
+        # Notebooks routinely contain magic commands (%) and shell escapes (!) that
+        # break ast.parse, so a single regex pass over the code is the primary path
+        imports.update(_extract_imports_with_regex(code_content))
+        
+    except Exception:
+        pass
+        
+    return imports, has_cuda
+
+
+def _parse_ast(source: Union[str, bytes, mmap.mmap], file_path: Path) -> ast.AST:
+    """compile() straight to an AST (what ast.parse wraps), without inheriting caller flags."""
+    return compile(source, str(file_path), 'exec', flags=ast.PyCF_ONLY_AST, dont_inherit=True)
+
+
+def _extract_imports_with_regex(code: str) -> Set[str]:
+    """Line-regex import extraction for code that need not parse (e.g. notebook cells)."""
+    found = set()
+    for from_name, import_names in _IMPORT_LINE_RE.findall(code):
+        if from_name:
+            found.add(from_name.split('.')[0])
+            continue
+        # 'import a.b as x, c' -> ['a', 'c']
+        for part in import_names.split(','):
+            words = part.split()
+            if words:
+                top = words[0].split('.')[0]
+                if top.isidentifier():
+                    found.add(top)
+    return found
+
+
+class _ImportCollector(ast.NodeVisitor):
+    """
+    Collects top-level module names from import statements.
+    Imports are statements, so expression subtrees are never entered.
+    """
+
+    def __init__(self):
+        self.found = set()
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for name in node.names:
+            self.found.add(name.name.split('.')[0])
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        if node.module:
+            # e.g., 'from sklearn.metrics import ...' -> 'sklearn'
+            self.found.add(node.module.split('.')[0])
+
+    def generic_visit(self, node: ast.AST) -> None:
+        if isinstance(node, ast.expr):
+            return
+        super().generic_visit(node)
+
+
+def _extract_imports_from_ast(tree: ast.AST) -> Set[str]:
+    """Helper to walk AST and find import nodes."""
+    collector = _ImportCollector()
+    collector.visit(tree)
+    return collector.found
+
+
+def _check_cuda_usage(content: Union[str, bytes, mmap.mmap]) -> bool:
+    """Heuristic check for GPU/CUDA usage (single case-insensitive pass, no lowered copy)."""
+    pattern = _CUDA_TEXT_RE if isinstance(content, str) else _CUDA_BYTES_RE
+    return pattern.search(content) is not None
+
+
+def _read_file_safe(path: Path) -> Union[bytes, mmap.mmap]:
+    """
+    Raw file bytes; regex, hashing and compile() all work without decoding.
+    Files above MMAP_THRESHOLD_BYTES are memory-mapped instead of copied onto the heap;
+    callers must close() the returned mmap.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size > MMAP_THRESHOLD_BYTES:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return f.read()
+    except (OSError, ValueError):
+        return b""
+
 
-        path.write_text('\n'.join(lines), encoding='utf-8')
-        logger.info(f"Summary saved to {path}")
\ No newline at end of file
+def _load_json(data: Union[bytes, mmap.mmap]) -> Any:
+    if isinstance(data, bytes):
+        return _json_loads(data)
+    if orjson is not None:
+        # orjson reads the mapping through a buffer view, without copying it
+        with memoryview(data) as view:
+            return orjson.loads(view)
+    return json.loads(bytes(data))
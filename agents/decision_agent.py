@@ -3,35 +3,80 @@ Decision Agent (Refactored Final Version).
 Analyzes project structure, detects Monorepo roots, and decides analysis strategy.
 """
 
+import asyncio
+import functools
 import logging
 import json
 import re
 import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Any
-from openai import OpenAI
+from string import Template
+from typing import Dict, FrozenSet, Iterator, List, Optional, Any, Tuple
 
 from config.settings import settings
+from utils.llm_cache import acached_chat, cached_chat
+from utils.openai_client import get_openai_client, new_async_openai_client
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+# orjson is optional: faster parsing of LLM decisions, which adds up in decide_many() batches
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 logger = logging.getLogger(__name__)
 
+# Only this much of a README is read for the decision prompt
+README_MAX_BYTES = 10 * 1024
+
+# README words that suggest the LLM could find setup instructions worth acting on
+_SETUP_SIGNALS_RE = re.compile(r"\b(?:install|conda|pip|poetry|docker|requirements|python\s*[23]\.)", re.IGNORECASE)
+
+# Dependency-list scrapers for setup.py / pyproject.toml (compiled once)
+_INSTALL_REQUIRES_RE = re.compile(r'install_requires\s*=\s*\[(.*?)\]', re.DOTALL)
+_DEPENDENCIES_RE = re.compile(r'dependencies\s*=\s*\[(.*?)\]', re.DOTALL)
+_QUOTED_RE = re.compile(r'["\']([^"\']+)["\']')
+
+
 class DecisionAgent:
     """Analyzes project structure to determine the best environment creation strategy."""
 
     # Priority order for configuration files
-    ENV_FILES_PRIORITY = [
+    ENV_FILES_PRIORITY = (
         'environment.yml', 'environment.yaml', 'conda.yaml',  # 1. Conda native
         'requirements.txt', 'requirements-dev.txt',           # 2. Pip standard
         'setup.py', 'pyproject.toml', 'Pipfile',              # 3. Python packaging
-        'Dockerfile', 'docker-compose.yml'                    # 4. Container (Last resort)
-    ]
+        'Dockerfile', 'docker-compose.yml',                   # 4. Container (Last resort)
+    )
+    ENV_FILES_SET = frozenset(ENV_FILES_PRIORITY)
 
-    DECISION_PROMPT = """You are a Python DevOps expert. Analyze the project to choose the best environment strategy.
+    README_FILES = ('README.md', 'README.txt', 'README')  # Tried in order
+
+    # Files that settle the decision on their own: name -> (env_type, reason)
+    FAST_TRACK_FILES = {
+        'environment.yml': ("conda", "Valid Conda environment file found."),
+        'environment.yaml': ("conda", "Valid Conda environment file found."),
+        'conda.yaml': ("conda", "Valid Conda environment file found."),
+        'setup.py': ("pip", "Found setup.py (installable package)."),
+        'requirements.txt': ("pip", "Found requirements.txt."),
+    }
+
+    DECISION_PROMPT = Template("""You are a Python DevOps expert. Analyze the project to choose the best environment strategy.
 
 Context:
-- Path: {current_path}
-- Files: {existing_files}
-- README Snippet: {readme_content}
+- Path: $current_path
+- Files: $existing_files
+- README Snippet: $readme_content
 
 Goal:
 Determine if we can use existing files or need deep code analysis.
@@ -42,156 +87,222 @@ Rules:
 3. If no config files -> proceed=true.
 
 Output JSON:
-{{
+{
     "has_env_setup": boolean,
     "env_type": "conda" | "pip" | "docker" | "poetry" | "none",
     "env_file": "path/to/best_file" or null,
     "proceed_with_analysis": boolean,
     "reason": "short explanation"
-}}
-"""
+}
+""")
 
     def __init__(self):
-        self.client = OpenAI(api_key=settings.api_key)
+        self._client = None
+        self._aclient = None
+        self._aclient_loop = None
         logger.info("DecisionAgent initialized")
 
+    @property
+    def client(self):
+        """Shared OpenAI client, fetched on first use so importing the agent stays cheap."""
+        if self._client is None:
+            self._client = get_openai_client()
+        return self._client
+
+    @property
+    def aclient(self):
+        """
+        Async OpenAI client for decide_async()/decide_many(), one per event loop: its connection pool
+        belongs to the loop it was created on, so a later asyncio.run() gets a fresh client.
+        """
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = new_async_openai_client()
+            self._aclient_loop = loop
+        return self._aclient
+
     # ----------------------------------------------------------------
     # 1. Main Decision Logic
     # ----------------------------------------------------------------
     def decide(self, input_path: str) -> Dict[str, Any]:
         """Main entry point for decision making."""
-        logger.info(f"Analyzing project starting from: {input_path}")
-        input_dir = Path(input_path).resolve()
-
-        # 1. Monorepo Detection (Find True Root)
-        target_directory = self._find_true_project_root(input_dir)
-        if target_directory != input_dir:
-            logger.info(f"🚀 Monorepo detected! Redirecting to: {target_directory}")
+        fast_decision, target_directory, existing_files, readme = self._prepare_decision(input_path)
+        if fast_decision:
+            return fast_decision
 
-        # 2. Scan for config files in the true root
-        existing_files = self._scan_env_files(target_directory)
+        # 4. Fallback to LLM Decision (existing_files is the complete list here)
+        logger.info("No obvious config found. Consulting LLM...")
+        return self._ask_llm_for_decision(target_directory, existing_files, readme)
 
-        # 3. Try Fast Track (Rule-based Decision)
-        fast_decision = self._try_fast_track_decision(existing_files, target_directory)
+    async def decide_async(self, input_path: str) -> Dict[str, Any]:
+        """Same as decide(), but the filesystem work runs in a thread and the LLM call is awaited."""
+        fast_decision, target_directory, existing_files, readme = await asyncio.to_thread(self._prepare_decision, input_path)
         if fast_decision:
-            logger.info(f"Fast track decision: {fast_decision['reason']}")
             return fast_decision
 
-        # 4. Fallback to LLM Decision
         logger.info("No obvious config found. Consulting LLM...")
-        return self._ask_llm_for_decision(target_directory, existing_files)
+        return await self._ask_llm_for_decision_async(target_directory, existing_files, readme)
+
+    async def decide_many(self, input_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Decides for several projects concurrently.
+        At most settings.LLM_CONCURRENCY decisions are in flight, to stay under the API rate limit.
+        """
+        semaphore = asyncio.Semaphore(settings.LLM_CONCURRENCY)
+
+        async def _bounded(path: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.decide_async(path)
+
+        results = await asyncio.gather(*(_bounded(p) for p in input_paths), return_exceptions=True)
+
+        decisions = []
+        for path, result in zip(input_paths, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Decision failed for {path}: {result}")
+                result = self._build_response(False, "none", None, Path(path).resolve(), True, "Decision failed, falling back to deep analysis.")
+            decisions.append(result)
+        return decisions
 
     # ----------------------------------------------------------------
     # 2. Internal Core Logic
     # ----------------------------------------------------------------
-    def _find_true_project_root(self, start_path: Path) -> Path:
+    def _prepare_decision(self, input_path: str) -> Tuple[Optional[Dict], Path, List[Dict], Optional[str]]:
         """
-        Scoring algorithm to find the 'real' project root.
-        Improved: Scans deeper (depth=4) but skips junk folders for speed.
+        Everything decide() does before asking the LLM.
+        Returns (fast_decision, target_directory, existing_files, readme); fast_decision is None when the LLM is needed.
         """
-        MAX_SCAN_DEPTH = 4 
-        
-        candidates = []
-        
-        IGNORED_DIRS = {
-            '.git', '.idea', '.vscode', '__pycache__', 
-            'node_modules', 'venv', 'env', '.env', 'dist', 'build'
-        }
+        logger.info(f"Analyzing project starting from: {input_path}")
+        input_dir = Path(input_path).resolve()
 
-        for root, dirs, files in os.walk(start_path):
-            current = Path(root)
-            
-            dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+        # 1. Monorepo Detection (Find True Root)
+        target_directory = self._find_true_project_root(input_dir)
+        if target_directory != input_dir:
+            logger.info(f"🚀 Monorepo detected! Redirecting to: {target_directory}")
 
-            try:
-                depth = len(current.relative_to(start_path).parts)
-            except ValueError:
-                continue
+        # 2. Scan for config files in the true root, in priority order
+        present = self._list_files(target_directory, self.ENV_FILES_SET)
+        if present.isdisjoint(self.FAST_TRACK_FILES):
+            # No decisive file can win, so the LLM path is certain: read the README while the env files are stat'ed
+            with ThreadPoolExecutor(max_workers=1) as ex:
+                readme_future = ex.submit(self._read_readme, target_directory)
+                existing_files = list(self._iter_env_files(target_directory))
+                readme = readme_future.result()
+        else:
+            # 3. Try Fast Track (Rule-based Decision) as each file is seen; the first decisive hit wins
+            existing_files = []
+            for env_file in self._iter_env_files(target_directory):
+                existing_files.append(env_file)
+                fast_decision = self._try_fast_track_decision(env_file, target_directory)
+                if fast_decision:
+                    logger.info(f"Fast track decision: {fast_decision['reason']}")
+                    return fast_decision, target_directory, existing_files, None
+            readme = self._read_readme(target_directory)
+
+        # Nothing for the LLM to weigh: no env files and no setup hints in the README
+        if not existing_files and not _SETUP_SIGNALS_RE.search(readme or ""):
+            logger.info("No env files and no setup signals in README. Skipping LLM.")
+            skip = self._build_response(False, "none", None, target_directory, True, "README contains no setup signals; proceeding with analysis.")
+            return skip, target_directory, existing_files, readme
+
+        return None, target_directory, existing_files, readme
 
-            if depth > MAX_SCAN_DEPTH:
-                del dirs[:] 
-                continue
-                
-            score = 0
-            if any(f in files for f in ['setup.py', 'pyproject.toml', 'environment.yml', 'conda.yaml']):
-                score += 10
-            
-            if 'requirements.txt' in files:
-                score += 5
-            if 'src' in dirs or 'app' in dirs:
-                score += 5
-
-            if current.name.lower() in ['docs', 'tests', 'examples', 'scripts']:
-                score -= 10
-            
-            if score > 0:
-                candidates.append((score, current))
-        
-        if not candidates:
+    def _find_true_project_root(self, start_path: Path) -> Path:
+        """
+        Scoring algorithm to find the 'real' project root.
+        Improved: Scans deeper (depth=4) but skips junk folders for speed.
+        Results are memoized per start path, so repeated decide() calls don't re-walk the tree.
+        """
+        best = _score_project_roots(str(start_path))
+        if best is None:
             return start_path
-            
-        candidates.sort(key=lambda x: (-x[0], len(str(x[1]))))
-        
-        best_path = candidates[0][1]
+
+        best_score, best_str = best
+        best_path = Path(best_str)
         
         if best_path != start_path:
-            logger.debug(f"Root switched: {start_path} -> {best_path} (Score: {candidates[0][0]})")
+            logger.debug(f"Root switched: {start_path} -> {best_path} (Score: {best_score})")
             
         return best_path
 
-    def _scan_env_files(self, path: Path) -> List[Dict]:
-        found = []
+    def _iter_env_files(self, path: Path) -> Iterator[Dict]:
+        """Lazily yields the env files present in path, in priority order; files after an early exit are never stat'ed."""
+        present = self._list_files(path, self.ENV_FILES_SET)
         for name in self.ENV_FILES_PRIORITY:
-            f = path / name
-            if f.exists():
-                found.append({"name": name, "path": str(f), "size": f.stat().st_size})
-        return found
-
-    def _try_fast_track_decision(self, files: List[Dict], target_dir: Path) -> Optional[Dict]:
-        """Returns a decision dict if a clear winner exists, else None."""
-        for f in files:
-            name = f['name']
-            if f['size'] < 10: continue  # Skip empty files
-
-            # Priority 1: Conda files (Gold Standard)
-            if name in ['environment.yml', 'environment.yaml', 'conda.yaml']:
-                return self._build_response(True, "conda", f['path'], target_dir, False, "Valid Conda environment file found.")
-            
-            # Priority 2: setup.py (Python Standard)
-            if name == 'setup.py':
-                return self._build_response(True, "pip", f['path'], target_dir, False, "Found setup.py (installable package).")
-            
-            # Priority 3: requirements.txt (Common Standard)
-            if name == 'requirements.txt':
-                return self._build_response(True, "pip", f['path'], target_dir, False, "Found requirements.txt.")
-        
-        return None
+            if name in present:
+                file_path = os.path.join(path, name)
+                try:
+                    size = os.stat(file_path).st_size
+                except OSError:
+                    continue
+                yield {"name": name, "path": file_path, "size": size}
 
-    def _ask_llm_for_decision(self, target_dir: Path, files: List[Dict]) -> Dict:
-        readme = self._read_readme(target_dir)
-        files_str = "\n".join([f"- {f['name']}" for f in files]) if files else "None"
-        
+    def _list_files(self, path: Path, names: FrozenSet[str]) -> FrozenSet[str]:
+        """
+        Returns which of the wanted file names exist in path.
+        The listing is memoized by the directory's mtime, so repeated decide() calls skip the re-read.
+        """
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return frozenset()
+        return _list_dir_files(str(path), mtime_ns, names)
+
+    def _try_fast_track_decision(self, env_file: Dict, target_dir: Path) -> Optional[Dict]:
+        """Returns a decision dict if this file is a clear winner, else None."""
+        rule = self.FAST_TRACK_FILES.get(env_file['name'])
+        if rule is None or env_file['size'] < 10:  # Skip empty files
+            return None
+
+        env_type, reason = rule
+        return self._build_response(True, env_type, env_file['path'], target_dir, False, reason)
+
+    def _ask_llm_for_decision(self, target_dir: Path, files: List[Dict], readme: Optional[str]) -> Dict:
+        try:
+            content = cached_chat(
+                self.client,
+                ttl=settings.DECISION_CACHE_TTL,
+                **self._decision_request(target_dir, files, readme)
+            )
+            return self._parse_decision(content, target_dir)
+        except Exception as e:
+            logger.error(f"LLM Decision failed: {e}")
+            # Safe Fallback: Just analyze everything
+            return self._build_response(False, "none", None, target_dir, True, "LLM failed, falling back to deep analysis.")
+
+    async def _ask_llm_for_decision_async(self, target_dir: Path, files: List[Dict], readme: Optional[str]) -> Dict:
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "user", "content": self.DECISION_PROMPT.format(
-                        current_path=target_dir.name,
-                        existing_files=files_str,
-                        readme_content=readme[:2000] if readme else "No README"
-                    )}
-                ],
-                temperature=0.0,
-                response_format={"type": "json_object"}
+            content = await acached_chat(
+                self.aclient,
+                ttl=settings.DECISION_CACHE_TTL,
+                **self._decision_request(target_dir, files, readme)
             )
-            result = json.loads(response.choices[0].message.content)
-            result['target_directory'] = str(target_dir)
-            return result
+            return self._parse_decision(content, target_dir)
         except Exception as e:
             logger.error(f"LLM Decision failed: {e}")
             # Safe Fallback: Just analyze everything
             return self._build_response(False, "none", None, target_dir, True, "LLM failed, falling back to deep analysis.")
 
+    def _decision_request(self, target_dir: Path, files: List[Dict], readme: Optional[str]) -> Dict[str, Any]:
+        files_str = "\n".join([f"- {f['name']}" for f in files]) if files else "None"
+        return {
+            "model": settings.DECISION_MODEL,
+            "messages": [
+                {"role": "user", "content": self.DECISION_PROMPT.substitute(
+                    current_path=target_dir.name,
+                    existing_files=files_str,
+                    readme_content=readme[:2000] if readme else "No README"
+                )}
+            ],
+            "temperature": 0.0,
+            "response_format": {"type": "json_object"},
+        }
+
+    def _parse_decision(self, content: str, target_dir: Path) -> Dict:
+        result = _json_loads(content)
+        result['target_directory'] = str(target_dir)
+        return result
+
     # ----------------------------------------------------------------
     # 3. Helper Methods (Extraction & Utils)
     # ----------------------------------------------------------------
@@ -206,54 +317,84 @@ Output JSON:
 
         for env_file in self.ENV_FILES_PRIORITY:
             file_path = project_dir / env_file
-            
-            if file_path.exists() and file_path.stat().st_size > 0:
-                try:
-                    content = file_path.read_text(encoding='utf-8', errors='ignore')
 
-                    if env_file == 'setup.py':
-                        deps = self._extract_setup_py_deps(content)
-                        if deps:
-                            consolidated_parts.append(f"=== {env_file} (install_requires) ===\n{deps}\n")
-                    
-                    elif env_file == 'pyproject.toml':
-                        deps = self._extract_pyproject_deps(content)
-                        if deps:
-                            consolidated_parts.append(f"=== {env_file} (dependencies) ===\n{deps}\n")
+            # One stat() answers "exists", "is a file" and "non-empty"
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+                continue
+
+            try:
+                content = file_path.read_text(encoding='utf-8', errors='ignore')
+
+                if env_file == 'setup.py':
+                    deps = self._extract_setup_py_deps(content)
+                    if deps:
+                        consolidated_parts.append(f"=== {env_file} (install_requires) ===\n{deps}\n")
+                
+                elif env_file == 'pyproject.toml':
+                    deps = self._extract_pyproject_deps(content)
+                    if deps:
+                        consolidated_parts.append(f"=== {env_file} (dependencies) ===\n{deps}\n")
+                
+                else:
+                    consolidated_parts.append(f"=== {env_file} ===\n{content}\n")
                     
-                    else:
-                        consolidated_parts.append(f"=== {env_file} ===\n{content}\n")
-                        
-                except Exception as e:
-                    logger.warning(f"Error reading {env_file}: {e}")
+            except Exception as e:
+                logger.warning(f"Error reading {env_file}: {e}")
 
         return "\n".join(consolidated_parts) if consolidated_parts else ""
 
     def _extract_setup_py_deps(self, content: str) -> str:
         """Extract install_requires from setup.py using regex."""
-        match = re.search(r'install_requires\s*=\s*\[(.*?)\]', content, re.DOTALL)
+        match = _INSTALL_REQUIRES_RE.search(content)
         if match:
             deps_text = match.group(1)
-            deps = re.findall(r'["\']([^"\']+)["\']', deps_text)
+            deps = _QUOTED_RE.findall(deps_text)
             return '\n'.join(deps)
         return ""
 
     def _extract_pyproject_deps(self, content: str) -> str:
-        """Extract dependencies from pyproject.toml using regex."""
-        match = re.search(r'dependencies\s*=\s*\[(.*?)\]', content, re.DOTALL)
+        """
+        Extract dependencies from pyproject.toml.
+        Parses PEP 621 [project] and [tool.poetry] tables with tomllib; the regex
+        scrape is kept for interpreters without a TOML parser and for malformed files.
+        """
+        if tomllib is not None:
+            try:
+                data = tomllib.loads(content)
+            except tomllib.TOMLDecodeError:
+                data = None
+
+            if data is not None:
+                project_deps = data.get('project', {}).get('dependencies', [])
+                deps = [d for d in project_deps if isinstance(d, str)]
+                poetry_deps = data.get('tool', {}).get('poetry', {}).get('dependencies', {})
+                if isinstance(poetry_deps, dict):
+                    deps.extend(name for name in poetry_deps if name.lower() != 'python')
+                return '\n'.join(deps)
+
+        match = _DEPENDENCIES_RE.search(content)
         if match:
             deps_text = match.group(1)
-            deps = re.findall(r'["\']([^"\']+)["\']', deps_text)
+            deps = _QUOTED_RE.findall(deps_text)
             return '\n'.join(deps)
         return ""
 
     def _read_readme(self, path: Path) -> Optional[str]:
-        for n in ['README.md', 'README.txt', 'README']:
-            p = path / n
-            if p.exists():
-                try: 
-                    return p.read_text(encoding='utf-8', errors='ignore')
-                except: pass
+        for n in self.README_FILES:
+            readme_path = str(path / n)
+            try:
+                st = os.stat(readme_path)
+            except OSError:  # Missing or unreadable
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            content = _read_readme_cached(readme_path, st.st_mtime_ns, st.st_size)
+            if content is not None:
+                return content
         return None
 
     def _build_response(self, has_setup, type_, file_, target, proceed, reason):
@@ -264,4 +405,102 @@ Output JSON:
             "target_directory": str(target),
             "proceed_with_analysis": proceed,
             "reason": reason
-        }
\ No newline at end of file
+        }
+
+
+# ----------------------------------------------------------------
+# Memoized directory / README reads
+# ----------------------------------------------------------------
+# The mtime arguments are part of the cache key only: a changed directory or file misses the cache.
+@functools.lru_cache(maxsize=32)
+def _list_dir_files(path: str, mtime_ns: int, names: FrozenSet[str]) -> FrozenSet[str]:
+    """Reads the directory once; names are matched before is_file(), so unrelated entries cost nothing."""
+    try:
+        with os.scandir(path) as it:
+            return frozenset(entry.name for entry in it if entry.name in names and entry.is_file())
+    except OSError:
+        return frozenset()
+
+
+@functools.lru_cache(maxsize=32)
+def _read_readme_cached(path: str, mtime_ns: int, size: int) -> Optional[str]:
+    """Reads (and decodes) only the head of the README; the prompt uses a short snippet anyway."""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read(README_MAX_BYTES + 1)
+    except OSError:
+        return None
+
+    content = raw[:README_MAX_BYTES].decode('utf-8', errors='ignore')
+    if len(raw) > README_MAX_BYTES:
+        content += "\n... (truncated)"
+    return content
+
+
+# ----------------------------------------------------------------
+# Monorepo root scoring
+# ----------------------------------------------------------------
+MAX_SCAN_DEPTH = 4
+
+IGNORED_DIRS = frozenset({
+    '.git', '.idea', '.vscode', '__pycache__', 
+    'node_modules', 'venv', 'env', '.env', 'dist', 'build'
+})
+
+ROOT_MARKER_FILES = frozenset({'setup.py', 'pyproject.toml', 'environment.yml', 'conda.yaml'})
+SOURCE_DIR_NAMES = frozenset({'src', 'app'})
+NON_ROOT_DIR_NAMES = frozenset({'docs', 'tests', 'examples', 'scripts'})
+
+
+@functools.lru_cache(maxsize=64)
+def _score_project_roots(start: str) -> Optional[Tuple[int, str]]:
+    """
+    Depth-limited DFS over os.scandir, returning the best (score, path) or None.
+    DirEntry type checks come from the directory listing itself, so no per-entry stat is needed.
+    """
+    candidates = []
+    stack = [(start, 0)]
+
+    while stack:
+        current, depth = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        files = set()
+        dirs = []
+        for entry in entries:
+            if entry.is_dir():
+                if entry.name not in IGNORED_DIRS:
+                    dirs.append(entry)
+            else:
+                files.add(entry.name)
+
+        score = 0
+        if not files.isdisjoint(ROOT_MARKER_FILES):
+            score += 10
+        
+        if 'requirements.txt' in files:
+            score += 5
+        if any(d.name in SOURCE_DIR_NAMES for d in dirs):
+            score += 5
+
+        if os.path.basename(current).lower() in NON_ROOT_DIR_NAMES:
+            score -= 10
+        
+        if score > 0:
+            candidates.append((score, current))
+
+        if depth < MAX_SCAN_DEPTH:
+            # Reversed so the stack pops children in listing order, like os.walk
+            for entry in reversed(dirs):
+                if not entry.is_symlink():
+                    stack.append((entry.path, depth + 1))
+
+    if not candidates:
+        return None
+
+    candidates.sort(key=lambda x: (-x[0], len(x[1])))
+    return candidates[0]
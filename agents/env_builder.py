@@ -5,47 +5,174 @@ Environment Builder Agent (OS-Aware & Absolute Path).
 - Robust Logic: Maps packages and infers versions.
 """
 
+import asyncio
+import functools
+import hashlib
+import json
 import logging
+import os
 import re
 import yaml
 import platform  
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Tuple, Any, Dict
-
-from openai import OpenAI
+from typing import Final, Iterable, Iterator, List, Optional, Tuple, Any, Dict, Union
 
 from config.settings import settings
-from utils import sanitize_env_name
+from utils import sanitize_env_name, strip_markdown_fences, IMPORT_TO_PACKAGE
+from utils.llm_cache import acached_chat, cached_chat, get_cached, put_cached
+from utils.openai_client import get_openai_client, new_async_openai_client, run_chat_batch
+from utils.env_resolver import CONDA_PREFERRED, CONDA_UNPINNED, DependencyResolver, render_environment_yml, to_conda_name
+from utils.semantic_cache import embed_text, find_similar, remember_similar
+
+try:
+    import hyperscan  # Optional: SIMD regex matcher for the version scan
+except ImportError:
+    hyperscan = None
+
+try:
+    import re2  # Optional: linear-time RE2 engine for the version scan when hyperscan is absent
+except ImportError:
+    re2 = None
+
+# libyaml-backed loader/dumper when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
 
 logger = logging.getLogger(__name__)
 
+# ---- Heuristic triggers for minimum Python versions ----
+# `match`/`case` statements, fused into one pass
+_PY310_PATTERN = r"^\s*(?:match|case)\s+.+:\s*$"
 
-class EnvironmentBuilder:
-    """Builds a Conda environment.yml file from analysis results."""
 
-    # ------------------------------------------------------------------
-    # 🧠 PROMPT FOR SUMMARY 
-    # ------------------------------------------------------------------
-    BUILD_FROM_SUMMARY_PROMPT = """
+def _compile_py310_re():
+    """Bytes pattern (files are scanned undecoded); RE2 when available, else the stdlib engine."""
+    pattern = _PY310_PATTERN.encode()
+    if re2 is not None:
+        try:
+            return re2.compile(b"(?m)" + pattern)
+        except Exception as e:
+            logger.debug(f"RE2 could not compile the version pattern ({e}), using re")
+    return re.compile(pattern, re.MULTILINE)
+
+
+_PY310_RE = _compile_py310_re()
+
+
+def _compile_hyperscan_db():
+    if hyperscan is None:
+        return None
+    try:
+        db = hyperscan.Database()
+        db.compile(expressions=[_PY310_PATTERN.encode()], ids=[0], flags=[hyperscan.HS_FLAG_MULTILINE])
+        return db
+    except Exception as e:
+        logger.debug(f"Hyperscan database unavailable ({e}), using re")
+        return None
+
+
+_PY310_HS_DB = _compile_hyperscan_db()
+
+# ---- Summary hints / YAML post-processing ----
+_RE_PY_HINT = re.compile(r"Python\s+Version\s+Hint:\s*([0-9]+\.[0-9]+)", re.IGNORECASE)
+_RE_REQ_PY = re.compile(r"Requires-Python:\s*>=\s*([0-9]+\.[0-9]+)", re.IGNORECASE)
+_RE_PY_DEP = re.compile(r"^\s*-\s*python\s*=", re.MULTILINE)
+_RE_DEPS = re.compile(r"^[ \t]*dependencies:[ \t]*$", re.MULTILINE)
+_RE_CUDA = re.compile(r"CUDA\s+Required:\s*(?:Yes|True)", re.IGNORECASE)  # CodeScanner summary flag
+_RE_GPU_KEYWORDS = re.compile(r"nvidia|cuda|tensorflow-gpu|torch|pytorch", re.IGNORECASE)
+_RE_ENV_NAME = re.compile(r"^name:.*$", re.MULTILINE)
+
+# ---- Local (LLM-free) conversion of plain requirements files ----
+# `name [spec[, spec...]] [# comment]`; extras, markers, URLs and pip options don't match
+_RE_SIMPLE_REQ = re.compile(
+    r"^([A-Za-z0-9][A-Za-z0-9._-]*)\s*"
+    r"((?:[<>=!~]=|[<>])\s*[A-Za-z0-9.*+!_-]+(?:\s*,\s*(?:[<>=!~]=|[<>])\s*[A-Za-z0-9.*+!_-]+)*)?"
+    r"\s*(?:#.*)?$"
+)
+_RE_REQ_SECTION = re.compile(r"^=== (requirements[\w.-]*\.txt) ===$")
+
+# Directories never worth descending into when looking for source files
+SKIP_DIRS = frozenset({
+    '.git', 'node_modules', '.venv', 'venv', '__pycache__',
+    'build', 'dist', '.tox', '.mypy_cache', '.pytest_cache',
+})
+
+# Upper bound on files checked when falling back to a whole-repo scan
+MAX_VERSION_SCAN_FILES = 500
+
+# match/case almost always shows up early; huge generated files are only read this far
+PY310_SCAN_BYTES = 64 * 1024
+
+# Per-file 3.10 verdicts keyed by (path, mtime_ns, size); cleared when it grows past the cap
+_PY310_MEMO: Dict[Tuple[str, int, int], bool] = {}
+PY310_MEMO_MAX = 10_000
+
+# Import names that differ from their package names, rendered once for the static prompt prefix
+_IMPORT_PACKAGE_TABLE = "\n".join(
+    f"- `{imp}` → `{pkg}`" for imp, pkg in IMPORT_TO_PACKAGE.items() if imp != pkg
+) + "\n"
+
+# Default cap for _read_text (summaries are small; this only guards against runaway files)
+READ_TEXT_MAX_BYTES = 256 * 1024
+
+# Summaries go into the prompt verbatim; beyond this (~16k tokens) the tail is dropped
+SUMMARY_MAX_BYTES = 64 * 1024
+
+# Below this many candidate files the version scan stays serial (pool startup costs more)
+PARALLEL_MIN_FILES = 16
+PY310_SCAN_THREADS = 16
+
+# Prompts are split into a static system prefix (rules only, identical on every call, so
+# OpenAI's automatic prompt-prefix caching applies) and a short per-call tail with the data.
+_CONDA_EXPERT: Final[str] = "You are a Conda expert. You ALWAYS map 'torch' to 'pytorch' and 'opencv-python' to 'opencv'. The environment.yml you produce must be valid YAML."
+
+# Single exemplar of the expected output shape (kept static so it stays in the cached prefix)
+_YAML_EXAMPLE: Final[str] = """
+### ✅ EXAMPLE OUTPUT
+name: example_project
+channels:
+  - conda-forge
+  - pytorch
+  - defaults
+dependencies:
+  - python=3.10
+  - numpy
+  - pandas
+  - pytorch
+  - opencv
+  - pip
+  - pip:
+      - some-pure-python-package==1.2.0
+"""
+
+# Text both build prompts share, placed FIRST: OpenAI caches identical prompt prefixes
+# server-side, so the two build modes reuse one cached prefix instead of each paying for it.
+_SHARED_PREFIX: Final[str] = _CONDA_EXPERT + """
+
 You are a Senior DevOps Engineer.
+""" + _YAML_EXAMPLE
+
+# Output contracts go LAST, one per mode, so a prompt never carries two conflicting ones
+_SINGLE_PROJECT_FORMAT: Final[str] = """
+### 📦 RESPONSE FORMAT
+Respond with a JSON object of the form {"environment_yml": "<complete environment.yml text>"} and nothing else.
+"""
+
+# ------------------------------------------------------------------
+# 🧠 PROMPT FOR SUMMARY 
+# ------------------------------------------------------------------
+_SUMMARY_RULES: Final[str] = """
 Your task is to create a robust `environment.yml` file based on the provided dependency summary.
 
 ### 💻 EXECUTION CONTEXT (CRITICAL)
-- **Current Hardware:** {system_context}
+- The current hardware is given with the project details.
 - **Rule:** If the hardware is **Apple Silicon (M1/M2/M3/M4/etc)**:
   1. You **MUST** prioritize `conda-forge` channel (Put it first).
   2. You **MUST** use `conda` packages for `dlib`, `numpy`, `scipy` (Avoid pip build errors on ARM64).
   3. **DO NOT** pin `dlib` version (e.g. use `dlib`, NOT `dlib=19.9`).
   4. `libjpeg` often fails on Mac; use `libjpeg-turbo` instead.
 
-### PROJECT DETAILS
-- **Project Name:** {project_name}
-- **Python Version (target):** {python_version}
-- **CUDA Requirement:** {cuda_version}
-
-### DETECTED DEPENDENCIES (Summary)
-{summary_content}
-
 ### 🚨 STRICT RULES
 
 1. **CRITICAL: PACKAGE MAPPING (TRANSLATION):**
@@ -74,23 +201,48 @@ Your task is to create a robust `environment.yml` file based on the provided dep
    - `defaults`
 
 5. **OUTPUT FORMAT:**
-   - Return ONLY raw YAML (no markdown).
+   - The `environment_yml` value is raw YAML (no markdown).
+
+### 📚 IMPORT NAME → PACKAGE NAME REFERENCE
+Detected imports are module names; resolve them with this table first, then apply the mapping rules above.
+""" + _IMPORT_PACKAGE_TABLE
+
+# Output contract when several projects share one request (build_from_summaries)
+_MULTI_PROJECT_FORMAT: Final[str] = """
+### 📦 RESPONSE FORMAT (MULTIPLE PROJECTS)
+The message contains several projects, each under a `=== PROJECT <id> ===` header.
+Build one environment.yml per project, applying every rule above to each independently.
+Respond with a JSON object of the form
+{"projects": [{"id": <id>, "environment_yml": "<complete environment.yml text>"}, ...]}
+with exactly one entry per project, and nothing else.
 """
 
-    # ------------------------------------------------------------------
-    # 🧠 PROMPT FOR EXISTING FILES
-    # ------------------------------------------------------------------
-    BUILD_FROM_EXISTING_FILES_PROMPT = """
-You are a Senior DevOps Engineer.
+BUILD_FROM_SUMMARY_SYSTEM: Final[str] = _SHARED_PREFIX + _SUMMARY_RULES + _SINGLE_PROJECT_FORMAT
+BUILD_FROM_SUMMARIES_SYSTEM: Final[str] = _SHARED_PREFIX + _SUMMARY_RULES + _MULTI_PROJECT_FORMAT
+
+
+def build_from_summary_prompt(
+    system_context: Any, project_name: str, python_version: str, cuda_version: str, summary_content: str
+) -> str:
+    """Per-call tail for BUILD_FROM_SUMMARY_SYSTEM; braces in the summary are inserted verbatim."""
+    return (
+        "### PROJECT DETAILS\n"
+        f"- **Current Hardware:** {system_context}\n"
+        f"- **Project Name:** {project_name}\n"
+        f"- **Python Version (target):** {python_version}\n"
+        f"- **CUDA Requirement:** {cuda_version}\n"
+        "\n"
+        "### DETECTED DEPENDENCIES (Summary)\n"
+        f"{summary_content}\n"
+    )
+
+
+# ------------------------------------------------------------------
+# 🧠 PROMPT FOR EXISTING FILES
+# ------------------------------------------------------------------
+BUILD_FROM_EXISTING_FILES_SYSTEM: Final[str] = _SHARED_PREFIX + """
 Your task is to convert existing environment file(s) into a unified Conda `environment.yml` file.
 
-### PROJECT DETAILS
-- **Project Name:** {project_name}
-- **Python Version (target):** {python_version}
-
-### EXISTING ENVIRONMENT FILES CONTENT
-{collected_content}
-
 ### 🚨 STRICT RULES
 
 1. **CRITICAL: PACKAGE NORMALIZATION:**
@@ -102,19 +254,52 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
    - If building for macOS (Implicit), do not force `cudatoolkit`.
 
 3. **OUTPUT FORMAT:**
-   - Return ONLY raw YAML.
+   - The `environment_yml` value is raw YAML.
    - No markdown.
-"""
+""" + _SINGLE_PROJECT_FORMAT
+
 
-    # ---- Heuristic triggers for minimum Python versions ----
-    _PY310_PATTERNS = [
-        re.compile(r"^\s*match\s+.+:\s*$", re.MULTILINE),
-        re.compile(r"^\s*case\s+.+:\s*$", re.MULTILINE),
-    ]
+def build_from_existing_files_prompt(project_name: str, python_version: str, collected_content: str) -> str:
+    """Per-call tail for BUILD_FROM_EXISTING_FILES_SYSTEM."""
+    return (
+        "### PROJECT DETAILS\n"
+        f"- **Project Name:** {project_name}\n"
+        f"- **Python Version (target):** {python_version}\n"
+        "\n"
+        "### EXISTING ENVIRONMENT FILES CONTENT\n"
+        f"{collected_content}\n"
+    )
 
-    def __init__(self):
-        self.client = OpenAI(api_key=settings.api_key)
-        logger.info("EnvironmentBuilder initialized")
+
+class EnvironmentBuilder:
+    """Builds a Conda environment.yml file from analysis results."""
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or settings.BUILDER_MODEL
+        self._client = None
+        self._aclient = None
+        self._aclient_loop = None
+        self.resolver = DependencyResolver()
+        logger.info(f"EnvironmentBuilder initialized (model: {self.model})")
+
+    @property
+    def client(self):
+        """Shared OpenAI client, fetched on first use so importing the agent stays cheap."""
+        if self._client is None:
+            self._client = get_openai_client()
+        return self._client
+
+    @property
+    def aclient(self):
+        """
+        Async OpenAI client for the *_async builds and build_many(), one per event loop: its connection pool
+        belongs to the loop it was created on, so a later asyncio.run() gets a fresh client.
+        """
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = new_async_openai_client()
+            self._aclient_loop = loop
+        return self._aclient
 
     # ----------------------------
     # Public API
@@ -130,9 +315,87 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
         """
         Generate environment.yml content from a dependency summary file.
         """
+        prompt, target_python, scope, draft = self._prepare_summary_prompt(summary_path, project_name, python_version, repo_root, system_context)
+        if draft is not None:
+            env_content = draft
+        elif settings.semantic_cache_enabled:
+            env_content = self._call_llm_semantic(prompt, scope, sanitize_env_name(project_name))
+        else:
+            env_content = self._call_llm(prompt, BUILD_FROM_SUMMARY_SYSTEM)
+        return self._finish_summary_build(env_content, target_python)
+
+    def build_from_summary_batch(self, jobs: List[Dict[str, Any]]) -> List[str]:
+        """
+        Generate environment.yml content for many summaries through the OpenAI Batch API.
+        Each job holds build_from_summary() keyword arguments; results keep the job order.
+        Cached answers are reused, and jobs the batch could not answer are retried one by one.
+        """
+        prepared = [self._prepare_summary_prompt(**job) for job in jobs]
+        requests = [self._llm_request(prompt, BUILD_FROM_SUMMARY_SYSTEM) for prompt, _, _, _ in prepared]
+
+        # Locally resolved drafts and cached answers never reach the batch
+        answers = [
+            draft if draft is not None else get_cached(ttl=settings.BUILD_CACHE_TTL, **req)
+            for (_, _, _, draft), req in zip(prepared, requests)
+        ]
+        missing = [i for i, answer in enumerate(answers) if answer is None]
+        if missing:
+            try:
+                batch_answers = run_chat_batch(self.client, [requests[i] for i in missing])
+            except Exception as e:
+                logger.warning(f"Batch build failed ({e}), falling back to individual calls")
+                batch_answers = [None] * len(missing)
+            for i, answer in zip(missing, batch_answers):
+                if answer:
+                    put_cached(answer, **requests[i])
+                    answers[i] = answer.strip()
+
+        results = []
+        for (prompt, target_python, _, _), answer in zip(prepared, answers):
+            if answer is None:
+                answer = self._call_llm(prompt, BUILD_FROM_SUMMARY_SYSTEM)
+            results.append(self._finish_summary_build(answer, target_python))
+        return results
+
+    def build_from_summaries(self, jobs: List[Dict[str, Any]], group_size: Optional[int] = None) -> List[str]:
+        """
+        Generate environment.yml content for many summaries, packing up to group_size projects
+        into each chat request (fewer requests when rate-limited per request, not per token).
+        Each job holds build_from_summary() keyword arguments; results keep the job order.
+        Projects a grouped answer does not cover are retried one by one.
+        """
+        group_size = group_size or settings.SUMMARY_GROUP_SIZE
+        prepared = [self._prepare_summary_prompt(**job) for job in jobs]
+
+        answers: List[Optional[str]] = [draft for _, _, _, draft in prepared]
+        pending = [i for i, answer in enumerate(answers) if answer is None]
+        for start in range(0, len(pending), group_size):
+            group = pending[start:start + group_size]
+            grouped = self._call_llm_grouped([prepared[i][0] for i in group])
+            for i, answer in zip(group, grouped):
+                answers[i] = answer if answer is not None else self._call_llm(prepared[i][0], BUILD_FROM_SUMMARY_SYSTEM)
+
+        return [
+            self._finish_summary_build(answer, target_python)
+            for (_, target_python, _, _), answer in zip(prepared, answers)
+        ]
+
+    def _prepare_summary_prompt(
+        self,
+        summary_path: str,
+        project_name: str = "my_project",
+        python_version: Optional[str] = None,
+        repo_root: Optional[str] = None,
+        system_context: Any = "Unknown"
+    ) -> Tuple[str, str, str, Optional[str]]:
+        """
+        Everything build_from_summary() does before the LLM call.
+        Returns (prompt, target_python, scope, draft); scope holds the inputs that must match exactly
+        for a semantic-cache hit (settings, detected imports), and draft is a locally resolved YAML when no LLM call is needed (else None).
+        """
         logger.info(f"Building environment.yml from summary: {summary_path}")
 
-        summary_content = self._read_text(summary_path)
+        summary_content = self._read_text(summary_path, max_bytes=SUMMARY_MAX_BYTES)
         sanitized_name = sanitize_env_name(project_name)
         
         # [New] Active GPU detection
@@ -151,18 +414,31 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
         target_python = self._choose_python_version(python_version, inferred_py)
         
         # Inject System Context into Prompt
-        prompt = self.BUILD_FROM_SUMMARY_PROMPT.format(
+        prompt = build_from_summary_prompt(
             system_context=system_context,
             project_name=sanitized_name,
             python_version=target_python,
             cuda_version=cuda_version,
             summary_content=summary_content
         )
-
-        env_content = self._call_llm(prompt)
-        env_content = self._clean_markdown(env_content)
+        # The exact import set and config-file hints are part of the scope: summaries that differ by one
+        # import (torch vs tensorflow) or one pin can still embed above the threshold, and must never share a YAML
+        imports = ",".join(sorted(set(self.resolver.detected_imports(summary_content))))
+        hints_digest = hashlib.sha256(self.resolver.config_hints(summary_content).encode("utf-8")).hexdigest()[:16]
+        scope = f"{self.model}|{system_context}|{target_python}|{cuda_version}|{imports}|{hints_digest}"
+
+        draft, confidence = self.resolver.resolve(
+            summary_content, sanitized_name, target_python, cuda_required=cuda_version.startswith("CUDA")
+        )
+        if draft is not None and confidence >= settings.RESOLVER_MIN_CONFIDENCE:
+            logger.info("⚡ All detected imports resolved locally: skipping the LLM call")
+        else:
+            draft = None
+        return prompt, target_python, scope, draft
+
+    def _finish_summary_build(self, env_content: str, target_python: str) -> str:
+        env_content = _extract_env_yml(env_content)
         env_content = self._ensure_python_dep(env_content, target_python)
-
         return env_content
 
     def build_from_existing_files(
@@ -177,24 +453,96 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
         """
         Generate environment.yml content from existing environment files.
         """
+        env_content, prompt = self._prepare_existing_files_build(collected_content, project_name, python_version, system_context)
+        if env_content is None:
+            env_content = _extract_env_yml(self._call_llm(prompt, BUILD_FROM_EXISTING_FILES_SYSTEM))
+        return self._finish_existing_files_build(env_content, python_version, target_directory, root_directory)
+
+    # ----------------------------
+    # Async API (overlaps API latency across projects)
+    # ----------------------------
+    async def build_from_summary_async(
+        self,
+        summary_path: str,
+        project_name: str = "my_project",
+        python_version: Optional[str] = None,
+        repo_root: Optional[str] = None,
+        system_context: Any = "Unknown"
+    ) -> str:
+        """Same as build_from_summary(), but the file/scan work runs in a thread and the LLM call is awaited."""
+        prompt, target_python, scope, draft = await asyncio.to_thread(
+            self._prepare_summary_prompt, summary_path, project_name, python_version, repo_root, system_context
+        )
+        if draft is not None:
+            env_content = draft
+        elif settings.semantic_cache_enabled:
+            env_content = await asyncio.to_thread(self._call_llm_semantic, prompt, scope, sanitize_env_name(project_name))
+        else:
+            env_content = await self._acall_llm(prompt, BUILD_FROM_SUMMARY_SYSTEM)
+        return self._finish_summary_build(env_content, target_python)
+
+    async def build_from_existing_files_async(
+        self,
+        collected_content: str,
+        project_name: str = "my_project",
+        python_version: str = "3.9",
+        target_directory: Optional[str] = None,
+        root_directory: Optional[str] = None,
+        system_context: Any = "Unknown"
+    ) -> str:
+        """Same as build_from_existing_files(), with the LLM call awaited."""
+        env_content, prompt = self._prepare_existing_files_build(collected_content, project_name, python_version, system_context)
+        if env_content is None:
+            env_content = _extract_env_yml(await self._acall_llm(prompt, BUILD_FROM_EXISTING_FILES_SYSTEM))
+        return self._finish_existing_files_build(env_content, python_version, target_directory, root_directory)
+
+    async def build_many(self, jobs: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """
+        Builds several projects concurrently from build_from_summary() keyword arguments.
+        At most settings.LLM_CONCURRENCY builds are in flight; a failed job yields None.
+        """
+        semaphore = asyncio.Semaphore(settings.LLM_CONCURRENCY)
+
+        async def _bounded(job: Dict[str, Any]) -> str:
+            async with semaphore:
+                return await self.build_from_summary_async(**job)
+
+        results = await asyncio.gather(*(_bounded(job) for job in jobs), return_exceptions=True)
+
+        built = []
+        for job, result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Build failed for {job.get('project_name', job.get('summary_path'))}: {result}")
+                result = None
+            built.append(result)
+        return built
+
+    def _prepare_existing_files_build(
+        self, collected_content: str, project_name: str, python_version: str, system_context: Any
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Returns (env_content, None) when the YAML can be built locally, else (None, prompt)."""
         logger.info("Building environment.yml from existing environment files...")
 
         sanitized_name = sanitize_env_name(project_name)
 
-        prompt = self.BUILD_FROM_EXISTING_FILES_PROMPT.format(
-            project_name=sanitized_name,
-            python_version=python_version,
-            collected_content=collected_content
-        )
-
         # [New] Hardware Compatibility Warning
         self._check_hardware_compatibility(collected_content, system_context)
 
+        env_content = self._requirements_to_yaml(collected_content, sanitized_name, python_version, system_context)
+        if env_content is not None:
+            logger.info("⚡ Plain requirements file: built environment.yml locally (no LLM call)")
+            return env_content, None
 
+        prompt = build_from_existing_files_prompt(
+            project_name=sanitized_name,
+            python_version=python_version,
+            collected_content=collected_content
+        )
+        return None, prompt
 
-        env_content = self._call_llm(prompt)
-        env_content = self._clean_markdown(env_content)
-        
+    def _finish_existing_files_build(
+        self, env_content: str, python_version: str, target_directory: Optional[str], root_directory: Optional[str]
+    ) -> str:
         if target_directory:
             env_content = self._inject_relative_path_install(
                 yaml_content=env_content, 
@@ -205,6 +553,62 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
         env_content = self._ensure_python_dep(env_content, python_version)
         return env_content
 
+    # ----------------------------
+    # Helper: Local requirements.txt conversion
+    # ----------------------------
+    def _requirements_to_yaml(
+        self, collected_content: str, env_name: str, python_version: str, system_context: Any = "Unknown"
+    ) -> Optional[str]:
+        """
+        Deterministic environment.yml for input made only of plain requirements*.txt files.
+        Returns None (use the LLM) as soon as anything else shows up: other file types,
+        extras, markers, URLs, -r/-e options, local versions (+cu118), GPU packages, or a host
+        that isn't a plain CPU Linux machine (the hardware rules live in the prompt).
+        """
+        if not self._is_plain_cpu_linux(system_context) or _RE_GPU_KEYWORDS.search(collected_content):
+            return None
+
+        conda_deps: List[str] = []
+        pip_deps: List[str] = []
+        seen = set()
+        in_requirements = False
+
+        for raw in collected_content.splitlines():
+            line = raw.strip()
+            if not line:
+                continue
+            if line.startswith("=== "):
+                in_requirements = _RE_REQ_SECTION.match(line) is not None
+                if not in_requirements:
+                    return None
+                continue
+            if not in_requirements:
+                return None
+            if line.startswith("#"):
+                continue
+
+            m = _RE_SIMPLE_REQ.match(line)
+            if m is None:
+                return None
+            spec = (m.group(2) or "").replace(" ", "")
+            if "+" in spec:
+                return None  # local version labels have no conda equivalent
+            conda_name = to_conda_name(m.group(1))
+            if conda_name in seen:
+                continue
+            seen.add(conda_name)
+
+            if conda_name in CONDA_PREFERRED and "~=" not in spec:
+                if conda_name in CONDA_UNPINNED:
+                    spec = ""
+                conda_deps.append(conda_name + spec)
+            else:
+                pip_deps.append(m.group(1) + spec)
+
+        if not conda_deps and not pip_deps:
+            return None
+        return render_environment_yml(env_name, python_version, conda_deps, pip_deps)
+
     # ----------------------------
     # Helper: Monorepo Path Injection
     # ----------------------------
@@ -213,7 +617,7 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
             target_path = Path(target_dir).resolve()
             install_cmd = f"-e {str(target_path)}"
 
-            data = yaml.safe_load(yaml_content)
+            data = yaml.load(yaml_content, Loader=_YAML_LOADER)
             
             if "dependencies" not in data:
                 data["dependencies"] = []
@@ -234,12 +638,17 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
             if install_cmd not in pip_list:
                 pip_list.append(install_cmd)
             
-            return yaml.dump(data, sort_keys=False)
+            return yaml.dump(data, Dumper=_YAML_DUMPER, sort_keys=False)
 
         except Exception as e:
             logger.error(f"Failed to inject absolute path: {e}")
             return yaml_content
 
+    @staticmethod
+    def _is_plain_cpu_linux(system_context: Any) -> bool:
+        """True only for a checked Linux host without an active GPU (the legacy string context can't tell)."""
+        return isinstance(system_context, dict) and system_context.get("os") == "Linux" and not system_context.get("gpu")
+
     # ----------------------------
     # Helper: Inference Logic 
     # ----------------------------
@@ -262,7 +671,7 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
             if gpu_info['type'] == 'nvidia':
                 logger.info(f"🎮 Active NVIDIA GPU detected: {gpu_info['details'][0]['name']}")
                 # Default to 11.8 if code needs it, otherwise let conda decide
-                if "CUDA Required: Yes" in summary_content or "True" in summary_content:
+                if _RE_CUDA.search(summary_content):
                     return "CUDA 11.8 (Active NVIDIA GPU confirmed)"
                 else:
                     return "None (NVIDIA GPU present but no CUDA code detected)"
@@ -273,7 +682,7 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
             logger.info("🍎 macOS detected (Legacy check)! Skipping CUDA requirements.")
             return "None (macOS detected - CUDA not supported, uses MPS/CPU)"
             
-        if "CUDA Required: Yes" in summary_content or "True" in summary_content:
+        if _RE_CUDA.search(summary_content):
             return "CUDA 11.8 (Auto-detected)"
             
         return "Not specified"
@@ -290,19 +699,13 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
         
         # Check if project needs GPU
         # 1. Check for explicit summary flag (from CodeScanner)
-        flag_in_summary = "CUDA Required: Yes" in summary_content or "True" in summary_content
+        flag_in_summary = _RE_CUDA.search(summary_content) is not None
         
         # 2. Check for keywords in raw content (from requirements.txt/environment.yml)
         # matches: nvidia-*, tensorflow-gpu, torch(implies gpu potential), cuda
-        has_gpu_keywords = False
-        keywords = ['nvidia', 'cuda', 'tensorflow-gpu', 'torch', 'pytorch']
-        
-        # Simple string search might be enough for warning purposes
-        for kw in keywords:
-            if kw in summary_content.lower():
-                has_gpu_keywords = True
-                break
-                
+        # Simple keyword search is enough for warning purposes (one case-insensitive pass)
+        has_gpu_keywords = _RE_GPU_KEYWORDS.search(summary_content) is not None
+
         needs_gpu = flag_in_summary or has_gpu_keywords
         
         if needs_gpu:
@@ -338,10 +741,10 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
         return "3.11"
 
     def _extract_python_hint_from_summary(self, summary_content: str) -> Optional[str]:
-        m = re.search(r"Python\s+Version\s+Hint:\s*([0-9]+\.[0-9]+)", summary_content, re.IGNORECASE)
+        m = _RE_PY_HINT.search(summary_content)
         if m: return m.group(1)
 
-        m = re.search(r"Requires-Python:\s*>=\s*([0-9]+\.[0-9]+)", summary_content, re.IGNORECASE)
+        m = _RE_REQ_PY.search(summary_content)
         if m: return m.group(1)
         return None
 
@@ -353,23 +756,73 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
             candidates = []
             for p in [root / "conftest.py", root / "tests"]:
                 if p.exists():
-                    if p.is_file(): candidates.append(p)
-                    else: candidates.extend(list(p.rglob("*.py")))
+                    if p.is_file(): candidates.append(str(p))
+                    else: candidates.extend(_bounded_py_files(str(p)))
 
             if not candidates:
-                candidates = list(root.rglob("*.py"))[:500]
+                candidates = list(_bounded_py_files(repo_root))
 
-            for pyfile in candidates:
-                try:
-                    text = self._read_text(str(pyfile))
-                    if any(rx.search(text) for rx in self._PY310_PATTERNS):
-                        return "3.10"
-                except Exception:
-                    continue
+            if self._any_file_triggers_py310(candidates):
+                return "3.10"
         except Exception:
             pass
         return None
 
+    def _any_file_triggers_py310(self, candidates: List[str]) -> bool:
+        """
+        Checks candidates (in parallel for large sets) and stops at the first hit.
+        Per-file verdicts are memoized by (path, mtime, size), so re-scans only read changed files.
+        """
+        pending = []
+        for path in candidates:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            key = (path, st.st_mtime_ns, st.st_size)
+            known = _PY310_MEMO.get(key)
+            if known:
+                return True
+            if known is None:
+                pending.append(key)
+
+        if not pending:
+            return False
+
+        paths = [key[0] for key in pending]
+        if len(_PY310_MEMO) > PY310_MEMO_MAX:
+            _PY310_MEMO.clear()
+
+        keys = {key[0]: key for key in pending}
+        results = self._map_py310(paths)
+        try:
+            for path, found in results:
+                _PY310_MEMO[keys[path]] = found
+                if found:
+                    return True
+        finally:
+            results.close()
+        return False
+
+    def _map_py310(self, paths: List[str]) -> Iterator[Tuple[str, bool]]:
+        """
+        Yields (path, _file_triggers_py310(path)) as results come in.
+        The work is bounded reads plus one regex per file, so larger batches use a thread pool.
+        """
+        if len(paths) < PARALLEL_MIN_FILES:
+            for path in paths:
+                yield path, _file_triggers_py310(path)
+            return
+
+        ex = ThreadPoolExecutor(max_workers=PY310_SCAN_THREADS)
+        try:
+            futures = {ex.submit(_file_triggers_py310, path): path for path in paths}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # The consumer stops at the first hit; drop whatever hasn't started yet
+            ex.shutdown(wait=False, cancel_futures=True)
+
     def _choose_python_version(self, user_version: Optional[str], inferred_version: str) -> str:
         if not user_version: return inferred_version
         try:
@@ -379,56 +832,193 @@ Your task is to convert existing environment file(s) into a unified Conda `envir
         except Exception:
             return user_version
 
-    def _parse_major_minor(self, v: str) -> Tuple[int, int]:
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def _parse_major_minor(v: str) -> Tuple[int, int]:
         parts = v.strip().split(".")
         return int(parts[0]), int(parts[1])
 
     # ----------------------------
     # LLM + YAML post-processing
     # ----------------------------
-    def _call_llm(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
-            model="gpt-4-turbo-preview",
-            messages=[
-                {"role": "system", "content": "You are a Conda expert. You ALWAYS map 'torch' to 'pytorch' and 'opencv-python' to 'opencv'. Output ONLY valid YAML."},
+    def _call_llm(self, prompt: str, system_prompt: str) -> str:
+        content = cached_chat(self.client, ttl=settings.BUILD_CACHE_TTL, stream=True, **self._llm_request(prompt, system_prompt))
+        return content.strip()
+
+    async def _acall_llm(self, prompt: str, system_prompt: str) -> str:
+        content = await acached_chat(self.aclient, ttl=settings.BUILD_CACHE_TTL, stream=True, **self._llm_request(prompt, system_prompt))
+        return content.strip()
+
+    def _call_llm_grouped(self, prompts: List[str]) -> List[Optional[str]]:
+        """One request for several summary prompts; returns each project's YAML, or None where missing."""
+        if len(prompts) == 1:
+            return [self._call_llm(prompts[0], BUILD_FROM_SUMMARY_SYSTEM)]
+
+        message = "\n\n".join(f"=== PROJECT {n} ===\n{prompt}" for n, prompt in enumerate(prompts, 1))
+        try:
+            content = self._call_llm(message, BUILD_FROM_SUMMARIES_SYSTEM)
+            projects = json.loads(content).get("projects", [])
+            by_id = {
+                int(p["id"]): p["environment_yml"] for p in projects
+                if isinstance(p, dict) and isinstance(p.get("environment_yml"), str)
+            }
+        except Exception as e:
+            logger.warning(f"Grouped build failed ({e}), falling back to individual calls")
+            return [None] * len(prompts)
+
+        logger.info(f"Grouped build answered {len(by_id)}/{len(prompts)} projects in one request")
+        return [by_id.get(n) for n in range(1, len(prompts) + 1)]
+
+    def _call_llm_semantic(self, prompt: str, scope: str, env_name: str) -> str:
+        """
+        Summary build through the semantic cache: a near-duplicate prompt under the same scope
+        reuses the earlier YAML (renamed for this project) instead of a chat completion.
+        """
+        try:
+            vector = embed_text(self.client, prompt)
+        except Exception as e:
+            logger.warning(f"Embedding failed ({e}), skipping semantic cache")
+            return self._call_llm(prompt, BUILD_FROM_SUMMARY_SYSTEM)
+
+        cached = find_similar(scope, vector, ttl=settings.BUILD_CACHE_TTL)
+        if cached is not None:
+            return _RE_ENV_NAME.sub(f"name: {env_name}", cached, count=1)
+
+        # Stored unwrapped, so the name line can be rewritten on a later hit
+        env_content = _extract_env_yml(self._call_llm(prompt, BUILD_FROM_SUMMARY_SYSTEM))
+        remember_similar(scope, vector, env_content)
+        return env_content
+
+    def _llm_request(self, prompt: str, system_prompt: str) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt},
             ],
-            temperature=0.1,
-        )
-        return response.choices[0].message.content.strip()
+            # Deterministic sampling: identical prompts give identical YAML, which is what the caches key on
+            "temperature": 0,
+            "seed": 0,
+            "response_format": {"type": "json_object"},
+        }
 
     def _ensure_python_dep(self, env_yaml: str, python_version: str) -> str:
-        if re.search(r"^\s*-\s*python\s*=", env_yaml, re.MULTILINE):
+        if _RE_PY_DEP.search(env_yaml):
             return env_yaml
 
-        lines = env_yaml.splitlines()
-        out = []
-        inserted = False
-        for idx, line in enumerate(lines):
-            out.append(line)
-            if not inserted and re.match(r"^\s*dependencies:\s*$", line):
-                out.append(f"  - python={python_version}")
-                inserted = True
-
-        if not inserted:
-            out.append("dependencies:")
-            out.append(f"  - python={python_version}")
-
-        return "\n".join(out).strip() + "\n"
-
-    def _clean_markdown(self, content: str) -> str:
-        if content.startswith("```"):
-            lines = content.split("\n")
-            if lines and lines[0].startswith("```"): lines = lines[1:]
-            if lines and lines[-1].startswith("```"): lines = lines[:-1]
-            content = "\n".join(lines)
-        return content.strip()
+        # Insert right after the first `dependencies:` line; the tail is kept as one slice
+        m = _RE_DEPS.search(env_yaml)
+        if m:
+            insert_at = m.end()
+            env_yaml = env_yaml[:insert_at] + f"\n  - python={python_version}" + env_yaml[insert_at:]
+        else:
+            env_yaml = env_yaml.rstrip() + f"\ndependencies:\n  - python={python_version}"
 
-    def _read_text(self, path: str) -> str:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            return f.read()
+        return env_yaml.strip() + "\n"
 
-    def save_to_file(self, content: str, output_path: str) -> None:
+    def _read_text(self, path: str, max_bytes: Optional[int] = READ_TEXT_MAX_BYTES) -> str:
+        """
+        Reads at most max_bytes (None = whole file) in binary mode and decodes once.
+        An oversized file is cut at the last complete line within the cap, with a warning.
+        """
+        with open(path, "rb") as f:
+            if max_bytes is None:
+                return f.read().decode("utf-8", errors="ignore")
+            data = f.read(max_bytes + 1)
+
+        if len(data) > max_bytes:
+            data = data[:max_bytes]
+            cut = data.rfind(b"\n")
+            if cut > 0:
+                data = data[:cut]
+            logger.warning(f"⚠️  {path} exceeds {max_bytes // 1024} KB; only the first {len(data)} bytes are used")
+        return data.decode("utf-8", errors="ignore")
+
+    def save_to_file(self, content: Union[str, Iterable[str]], output_path: str) -> None:
+        """Writes content, which may also be an iterable of chunks (e.g. a stream) written as they arrive."""
         with open(output_path, "w", encoding="utf-8") as f:
-            f.write(content)
-        logger.info(f"Environment.yml saved to: {output_path}")
\ No newline at end of file
+            if isinstance(content, str):
+                f.write(content)
+            else:
+                for chunk in content:
+                    f.write(chunk)
+        logger.info(f"Environment.yml saved to: {output_path}")
+
+
+def _extract_env_yml(content: str) -> str:
+    """
+    Pulls the YAML out of the {"environment_yml": ...} envelope the build prompts ask for.
+    Answers that are not that JSON (plain or fenced YAML) are fence-stripped instead.
+    """
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return strip_markdown_fences(content)
+    if isinstance(data, dict) and isinstance(data.get("environment_yml"), str):
+        return data["environment_yml"].strip()
+    return strip_markdown_fences(content)
+
+
+def _bounded_py_files(root: str, limit: int = MAX_VERSION_SCAN_FILES) -> Iterator[str]:
+    """
+    Yields up to `limit` .py files under root and stops walking once it has them.
+    Junk and hidden directories are pruned; dir entries come from os.scandir, so files are not stat-ed.
+    """
+    if limit <= 0:
+        return
+    stack = [root]
+    count = 0
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                name = entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    if name not in SKIP_DIRS and not name.startswith('.'):
+                        stack.append(entry.path)
+                elif name.endswith('.py'):
+                    yield entry.path
+                    count += 1
+                    if count >= limit:
+                        return
+
+
+def _file_triggers_py310(path: str) -> bool:
+    """
+    Reads only the head of the file as raw bytes, skipping the UTF-8 decode.
+    """
+    try:
+        with open(path, "rb") as f:
+            buf = f.read(PY310_SCAN_BYTES)
+    except OSError:
+        return False
+
+    if _PY310_HS_DB is not None:
+        found = _hyperscan_search(_PY310_HS_DB, buf)
+        if found is not None:
+            return found
+    return _PY310_RE.search(buf) is not None
+
+
+def _hyperscan_search(db, buf: bytes) -> Optional[bool]:
+    """Returns whether db matches buf, stopping at the first match; None if the scan itself failed."""
+    hits = []
+
+    def on_match(id_, start, end, flags, context):
+        hits.append(id_)
+        return True  # Non-zero return halts the scan
+
+    try:
+        db.scan(buf, match_event_handler=on_match)
+    except hyperscan.error:
+        # Halting from the handler surfaces as ScanTerminated (a hyperscan.error subclass)
+        if not hits:
+            return None
+    return bool(hits)
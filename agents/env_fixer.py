@@ -3,16 +3,64 @@ Environment Fixer Agent.
 Uses OpenAI GPT-4 to fix conda environment errors.
 """
 
+import asyncio
+import difflib
+import functools
 import logging
 import re
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from string import Template
 
 from config.settings import settings
+from utils.llm_cache import acached_chat, cached_chat, get_cached, put_cached
+from utils.openai_client import get_openai_client, new_async_openai_client, run_chat_batch
+from utils.helpers import strip_markdown_fences
 from utils.memory import Memory
-from typing import Any
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Error-log classifier for the rule-based fallback (one alternation scan)
+_SOLVER_ERROR_RE = re.compile(r"LibMambaUnsatisfiableError|UnsatisfiableError|conflicts")
+
+# Fallback rewrites, applied as whole-document MULTILINE substitutions
+_PY_PIN_RE = re.compile(r"^([ \t]*)-[ \t]*python[ \t]*[=<>!~][^\n]*$", re.MULTILINE)
+# A `- pip:` item plus every following line that is indented or blank (ends at the next top-level key)
+_PIP_BLOCK_RE = re.compile(r"^[ \t]*-[ \t]*pip:[^\n]*(?:\n(?!\S)[^\n]*)*", re.MULTILINE)
+# `- name<anything>`: group 2 is the bare package name (stops at a version operator or space)
+_DEP_ITEM_RE = re.compile(r"^([ \t]*)-[ \t]*([^\s=<>!~:#-][^\s=<>!~:#]*)[^\n]*$", re.MULTILINE)
+# Conda's "not available from current channels" error; group 1 is the first missing package name
+_PACKAGES_NOT_FOUND_RE = re.compile(
+    r"PackagesNotFoundError.*?^[ \t]*-[ \t]+(?:[\w.-]+::)?([A-Za-z0-9_.-]+?)(?=[=<>!~\s]|$)",
+    re.DOTALL | re.MULTILINE,
+)
+
+# Changed lines listed per side in extract_fix_summary()
+FIX_SUMMARY_MAX_ITEMS = 3
+
+# Error text sent to the LLM: conda/pip logs can run to tens of KB, but the cause is near the end
+ERROR_PROMPT_MAX_CHARS = 2000
+# Progress and warning spam that carries no diagnostic signal
+_ERROR_NOISE_RE = re.compile(
+    r"^\s*(?:warning:|Fetching |Downloading |Using cached |Requirement already satisfied|"
+    r"Collecting package metadata|Solving environment|Preparing transaction|Verifying transaction|Executing transaction)"
+    r"|\d+%\s*$",
+    re.IGNORECASE,
+)
+
+
+def _condense_error(err: str, max_chars: int = ERROR_PROMPT_MAX_CHARS) -> str:
+    """Drop noise and repeated lines from an error log and keep its last max_chars (cut at a line)."""
+    lines = dict.fromkeys(
+        line.rstrip() for line in err.splitlines() if line.strip() and not _ERROR_NOISE_RE.search(line)
+    )
+    condensed = "\n".join(lines)
+    if len(condensed) <= max_chars:
+        return condensed
+    tail = condensed[-max_chars:]
+    newline = tail.find("\n")
+    return tail[newline + 1:] if 0 <= newline < len(tail) - 1 else tail
+
 
 class EnvironmentFixer:
     """Fixes conda environment errors using AI."""
@@ -20,27 +68,33 @@ class EnvironmentFixer:
     # -------------------------------------------------------------------------
     # 🧠 INTELLIGENT AGENT PROMPT (Context-Aware Inference)
     # -------------------------------------------------------------------------
-    FIX_PROMPT = """You are an expert DevOps Engineer specializing in Python environments.
+    # Split into a constant head and tail around a small Template, so only the variable
+    # section is substituted per call instead of formatting the whole ~3 KB prompt.
+    FIX_PROMPT_HEAD = """You are an expert DevOps Engineer specializing in Python environments.
 A conda environment creation FAILED.
 Your goal is to fix the `environment.yml` not just by reacting to errors, but by **INFERRING the correct project context**.
 
-### 💻 EXECUTION CONTEXT (CRITICAL)
-- **Current Hardware:** {system_context}
+"""
+
+    FIX_PROMPT_VARS = Template("""### 💻 EXECUTION CONTEXT (CRITICAL)
+- **Current Hardware:** $system_context
 - **Rule:** If the hardware is **Apple Silicon (M1/M2/M3/M4)**:
   1. **Conflict Resolution:** If a package fails to build or install, try switching channel to `conda-forge`.
   2. **Binary Preference:** For `dlib`, `numpy`, `scipy`, `pandas`, ALWAYS use `conda` packages (avoid pip build errors).
   3. **Python Version:** Prefer 3.10 or 3.11 over 3.9 for better ARM64 support.
 
 ## 📄 CURRENT environment.yml:
-{current_yml}
+$current_yml
 
 ## ❌ ERROR LOG:
-{error_message}
+$error_message
 
 ## 📜 FIX HISTORY:
-{error_history}
+$error_history
 
-## 🧠 INTELLIGENT REASONING STRATEGY:
+""")
+
+    FIX_PROMPT_TAIL = """## 🧠 INTELLIGENT REASONING STRATEGY:
 
 ### 1. 🕵️‍♂️ INFER PYTHON VERSION (Dynamic & Intelligent)
 - If build errors occur (`gcc`, `Python.h`, `wheel`, `Py_UNICODE`), the Python version is likely incompatible.
@@ -79,140 +133,327 @@ Your goal is to fix the `environment.yml` not just by reacting to errors, but by
 
     def __init__(self):
         """Initialize the EnvironmentFixer with OpenAI client."""
-        self.client = OpenAI(api_key=settings.api_key)
+        self._client = None
+        self._aclient = None
+        self._aclient_loop = None
         logger.info("EnvironmentFixer initialized")
 
+    @property
+    def client(self):
+        """Shared OpenAI client, fetched on first use so importing the agent stays cheap."""
+        if self._client is None:
+            self._client = get_openai_client()
+        return self._client
+
+    @property
+    def aclient(self):
+        """
+        Async OpenAI client for fix_async(), one per event loop: its connection pool
+        belongs to the loop it was created on, so a later asyncio.run() gets a fresh client.
+        """
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = new_async_openai_client()
+            self._aclient_loop = loop
+        return self._aclient
+
     def fix(self, current_yml: str, error_message: str, memory: Memory, system_context: Any = "Unknown") -> str:
         """
         Generate a fixed environment.yml based on the error.
         """
+        deterministic = self._try_deterministic_fix(current_yml, error_message)
+        if deterministic is not None:
+            return deterministic
+
+        request = self._fix_request(current_yml, error_message, memory, system_context)
+        temperatures = settings.FIXER_CANDIDATE_TEMPERATURES
+
+        # Candidates are sampled concurrently and the rule-based fallback is computed speculatively
+        # while they are in flight, so a no-op answer doesn't cost another round trip
+        pool = ThreadPoolExecutor(max_workers=len(temperatures) + 1)
+        fallback = pool.submit(self._fallback_rules, current_yml, error_message)
+        try:
+            logger.info("🤖 AI is analyzing dependencies to infer the best environment configuration...")
+            candidates = [
+                pool.submit(cached_chat, self.client, ttl=settings.FIX_CACHE_TTL, stream=True, **candidate)
+                for candidate in self._candidate_requests(request)
+            ]
+            for future in as_completed(candidates):
+                try:
+                    fixed_yml = self._accept_fix(current_yml, future.result())
+                except Exception as e:
+                    logger.error(f"❌ AI Inference Failed: {e}")
+                    continue
+                if fixed_yml is not None:
+                    return fixed_yml
+            logger.info("Engaging Rule-Based Fallback Protocol...")
+            return self._report_fallback(*fallback.result())
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def fix_async(self, current_yml: str, error_message: str, memory: Memory, system_context: Any = "Unknown") -> str:
+        """Same as fix(), with the LLM calls awaited so fixes for several environments can overlap."""
+        deterministic = self._try_deterministic_fix(current_yml, error_message)
+        if deterministic is not None:
+            return deterministic
+
+        request = self._fix_request(current_yml, error_message, memory, system_context)
+
+        fallback = asyncio.ensure_future(asyncio.to_thread(self._fallback_rules, current_yml, error_message))
+        logger.info("🤖 AI is analyzing dependencies to infer the best environment configuration...")
+        candidates = [
+            asyncio.ensure_future(acached_chat(self.aclient, ttl=settings.FIX_CACHE_TTL, stream=True, **candidate))
+            for candidate in self._candidate_requests(request)
+        ]
+        try:
+            for next_done in asyncio.as_completed(candidates):
+                try:
+                    fixed_yml = self._accept_fix(current_yml, await next_done)
+                except Exception as e:
+                    logger.error(f"❌ AI Inference Failed: {e}")
+                    continue
+                if fixed_yml is not None:
+                    fallback.cancel()
+                    return fixed_yml
+        finally:
+            for candidate in candidates:
+                candidate.cancel()
+        logger.info("Engaging Rule-Based Fallback Protocol...")
+        return self._report_fallback(*await fallback)
+
+    def fix_many(self, jobs: List[Dict[str, Any]]) -> List[str]:
+        """
+        Fix many environments through the OpenAI Batch API (half price, not interactive).
+        Each job holds fix() keyword arguments; results keep the job order.
+        Cached answers are reused, and jobs the batch could not answer go through fix().
+        """
+        # Deterministic fixes never reach the batch
+        results: List[Optional[str]] = [
+            self._try_deterministic_fix(job["current_yml"], job["error_message"]) for job in jobs
+        ]
+        pending = [i for i, result in enumerate(results) if result is None]
+        requests = {i: self._fix_request(**jobs[i]) for i in pending}
+
+        answers = {i: get_cached(ttl=settings.FIX_CACHE_TTL, **requests[i]) for i in pending}
+        missing = [i for i in pending if answers[i] is None]
+        if missing:
+            try:
+                batch_answers = run_chat_batch(self.client, [requests[i] for i in missing])
+            except Exception as e:
+                logger.warning(f"Batch fix failed ({e}), falling back to individual calls")
+                batch_answers = [None] * len(missing)
+            for i, answer in zip(missing, batch_answers):
+                if answer:
+                    put_cached(answer, **requests[i])
+                    answers[i] = answer
+
+        for i in pending:
+            job, answer = jobs[i], answers[i]
+            if answer is None:
+                results[i] = self.fix(**job)
+                continue
+            fixed_yml = self._accept_fix(job["current_yml"], answer)
+            if fixed_yml is None:
+                logger.info("Engaging Rule-Based Fallback Protocol...")
+                fixed_yml = self._heuristic_fallback(job["current_yml"], job["error_message"])
+            results[i] = fixed_yml
+        return results
+
+    def _candidate_requests(self, request: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """One copy of the request per sampling temperature in settings.FIXER_CANDIDATE_TEMPERATURES."""
+        for temperature in settings.FIXER_CANDIDATE_TEMPERATURES:
+            yield {**request, "temperature": temperature}
+
+    def _fix_request(self, current_yml: str, error_message: str, memory: Memory, system_context: Any = "Unknown") -> Dict[str, Any]:
         logger.info("=" * 70)
         logger.info("🔧 FIXER AGENT STARTING DIAGNOSIS...")
         logger.info(f"   Context: {system_context}")
         logger.info("=" * 70)
 
+        # Memory is mutable, so its history is frozen into a tuple to key the prompt cache
+        prompt = self._render_fix_prompt(str(system_context), current_yml, error_message, tuple(memory.error_history))
+
+        model = settings.FIXER_MODEL
+        if len(memory.error_history) >= settings.FIXER_ESCALATE_AFTER:
+            model = settings.FIXER_ESCALATION_MODEL
+            logger.info(f"   Escalating to {model} after {len(memory.error_history)} failed fixes")
+
+        return {
+            "model": model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are a Python Dependency Expert. ANALYZE the error message carefully. For Apple Silicon (M1/M2/M4), prioritize 'conda-forge' and binary packages. Be surgical - only change what's necessary."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": 0.2,
+            # Scales with the YAML the model must echo back, so large environments aren't cut off
+            "max_tokens": max(settings.FIXER_MAX_TOKENS, int(len(current_yml) * settings.FIXER_TOKENS_PER_YML_CHAR)),
+        }
+
+    @classmethod
+    @functools.lru_cache(maxsize=64)
+    def _render_fix_prompt(cls, system_context: str, current_yml: str, error_message: str,
+                           error_history: Tuple[Tuple[str, str], ...]) -> str:
+        """Builds the user prompt; memoized so identical retries skip condensing and formatting."""
         # 1. Prepare History Context
         error_history_text = "None - this is the first attempt"
-        if memory.error_history:
+        if error_history:
             history_lines = []
-            for i, (err, fix_desc) in enumerate(memory.error_history, 1):
+            seen_errors = set()
+            for i, (err, fix_desc) in enumerate(error_history, 1):
                 history_lines.append(f"[Attempt {i}] Fix: {fix_desc}")
-                history_lines.append(f"[Attempt {i}] Error Snippet: {err[:300]}...") 
+                if err in seen_errors:
+                    history_lines.append(f"[Attempt {i}] Error Snippet: (same as before)")
+                    continue
+                seen_errors.add(err)
+                history_lines.append(f"[Attempt {i}] Error Snippet: {err}...") 
             error_history_text = "\n".join(history_lines)
 
         # 2. Build Prompt
-        prompt = self.FIX_PROMPT.format(
-            system_context=system_context, # Context Injection
-            current_yml=current_yml,
-            error_message=error_message,
-            error_history=error_history_text
-        )
+        return "".join((
+            cls.FIX_PROMPT_HEAD,
+            cls.FIX_PROMPT_VARS.substitute(
+                system_context=system_context, # Context Injection
+                current_yml=current_yml,
+                error_message=_condense_error(error_message),
+                error_history=error_history_text
+            ),
+            cls.FIX_PROMPT_TAIL,
+        ))
+
+    def _accept_fix(self, current_yml: str, content: str) -> Optional[str]:
+        """The AI's YAML, or None when it changed nothing and the fallback should be used."""
+        fixed_yml = strip_markdown_fences(content)
+
+        # 3. Validation
+        if self._are_yamls_identical(current_yml, fixed_yml):
+            logger.warning("⚠️  AI suggested no changes.")
+            return None
+
+        return fixed_yml
 
-        try:
-            logger.info("🤖 AI is analyzing dependencies to infer the best environment configuration...")
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a Python Dependency Expert. ANALYZE the error message carefully. For Apple Silicon (M1/M2/M4), prioritize 'conda-forge' and binary packages. Be surgical - only change what's necessary."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.2,
-            )
-
-            fixed_yml = response.choices[0].message.content.strip()
-            fixed_yml = self._clean_markdown(fixed_yml)
-
-            # 3. Validation
-            if self._are_yamls_identical(current_yml, fixed_yml):
-                logger.warning("⚠️  AI suggested no changes. Engaging Rule-Based Fallback Protocol...")
-                fixed_yml = self._heuristic_fallback(current_yml, error_message)
-
-            return fixed_yml
-
-        except Exception as e:
-            logger.error(f"❌ AI Inference Failed: {e}")
-            logger.info("Engaging Rule-Based Fallback Protocol...")
-            return self._heuristic_fallback(current_yml, error_message)
+    def _are_yamls_identical(self, yml1: str, yml2: str) -> bool:
+        """Order-insensitive comparison of the non-empty, non-comment lines (duplicates count)."""
+        return self._normalize_yml(yml1) == self._normalize_yml(yml2)
 
-    def _clean_markdown(self, text: str) -> str:
-        if "```" in text:
-            lines = text.split("\n")
-            lines = [l for l in lines if not l.strip().startswith("```")]
-            return "\n".join(lines).strip()
-        return text
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _normalize_yml(yml: str) -> Tuple[str, ...]:
+        """
+        Sorted, not a set: removing a duplicated dependency line is a real fix.
+        Memoized: current_yml is compared again on every candidate and retry.
+        """
+        return tuple(sorted(line for line in (ln.strip() for ln in yml.splitlines()) if line and not line.startswith("#")))
 
-    def _are_yamls_identical(self, yml1: str, yml2: str) -> bool:
-        def normalize(yml):
-            lines = [line.strip() for line in yml.strip().split("\n") if line.strip() and not line.strip().startswith("#")]
-            return "\n".join(sorted(lines))
-        return normalize(yml1) == normalize(yml2)
+    def _try_deterministic_fix(self, yml: str, error: str) -> Optional[str]:
+        """
+        Fixes high-confidence errors without the LLM: when conda can't find a pinned package,
+        the pin is dropped so the solver picks an available version. None when the rule doesn't apply.
+        """
+        m = _PACKAGES_NOT_FOUND_RE.search(error)
+        if m is None:
+            return None
+        missing = m.group(1).lower()
+
+        def unpin(dep: re.Match) -> str:
+            line, indent, pkg_name = dep.group(0), dep.group(1), dep.group(2)
+            if pkg_name.lower() != missing or ":" in line:
+                return line
+            return f"{indent}- {pkg_name}"
+
+        # Only conda dependencies are rewritten; `- pip:` blocks are copied through unchanged
+        parts = []
+        pos = 0
+        for block in _PIP_BLOCK_RE.finditer(yml):
+            parts.append(_DEP_ITEM_RE.sub(unpin, yml[pos:block.start()]))
+            parts.append(block.group(0))
+            pos = block.end()
+        parts.append(_DEP_ITEM_RE.sub(unpin, yml[pos:]))
+        fixed_yml = "".join(parts)
+
+        if fixed_yml == yml:
+            return None  # not pinned in the conda section; let the LLM decide (e.g. move it to pip)
+        logger.info(f"⚡ Deterministic fix: '{missing}' not found on the channels, dropping its version pin")
+        return fixed_yml
 
     def _heuristic_fallback(self, yml: str, error: str) -> str:
         """Rule-Based Fallback: When AI fails, apply aggressive hard rules."""
-        logger.info("🔧 [FALLBACK] Applying Aggressive Safety Net Rules...")
-
-        lines = yml.split('\n')
-        fixed_lines = []
-        in_pip_section = False
-
-        is_build_error = any(x in error for x in ["gcc", "g++", "Python.h", "build", "wheel", "cmake"])
-        is_solver_error = any(x in error for x in ["LibMambaUnsatisfiableError", "UnsatisfiableError", "conflicts"])
+        return self._report_fallback(*self._fallback_rules(yml, error))
 
-        for line in lines:
-            stripped = line.strip()
-
-            if stripped.startswith("- pip:"):
-                in_pip_section = True
-                fixed_lines.append(line)
-                continue
-                
-            if in_pip_section and stripped and not line.startswith(" ") and not line.startswith("\t"):
-                in_pip_section = False
-
-            if not stripped or stripped.startswith("#"):
-                fixed_lines.append(line)
-                continue
+    def _report_fallback(self, fixed_yml: str, notes: List[str]) -> str:
+        """Logs what the fallback changed; kept apart so a speculative run stays quiet until it is used."""
+        logger.info("🔧 [FALLBACK] Applying Aggressive Safety Net Rules...")
+        for note in notes:
+            logger.info(f"💡 [FALLBACK] {note}")
+        return fixed_yml
+
+    def _fallback_rules(self, yml: str, error: str) -> Tuple[str, List[str]]:
+        """Pure part of the fallback: returns (fixed_yml, notes) without logging."""
+        notes: List[str] = []
+        # Every rule targets solver conflicts; other errors leave the YAML untouched
+        if _SOLVER_ERROR_RE.search(error) is None:
+            return yml, notes
+
+        def unpin_python(m: re.Match) -> str:
+            notes.append("Removing Python version constraint")
+            return f"{m.group(1)}- python"
+
+        def relax(m: re.Match) -> str:
+            line, indent, pkg_name = m.group(0), m.group(1), m.group(2)
+            if ":" in line:
+                return line  # channel::package specs and nested mappings are left alone
+            new_line = f"{indent}- {pkg_name}"
+            if line.strip() != new_line.strip():
+                notes.append(f"Relaxing constraint: {line.strip()} -> {pkg_name}")
+            return new_line
+
+        yml = _PY_PIN_RE.sub(unpin_python, yml)
+
+        # Relax standard (conda) packages only; `- pip:` blocks are copied through unchanged
+        parts = []
+        pos = 0
+        for m in _PIP_BLOCK_RE.finditer(yml):
+            parts.append(_DEP_ITEM_RE.sub(relax, yml[pos:m.start()]))
+            parts.append(m.group(0))
+            pos = m.end()
+        parts.append(_DEP_ITEM_RE.sub(relax, yml[pos:]))
+        return "".join(parts), notes
 
-            if stripped.startswith("- python"):
-                if is_solver_error and ("=" in stripped or ">" in stripped or "<" in stripped):
-                    indent = line[:line.find("-")]
-                    logger.info("💡 [FALLBACK] Removing Python version constraint")
-                    fixed_lines.append(f"{indent}- python")
-                else:
-                    fixed_lines.append(line)
+    def extract_fix_summary(self, original_yml: str, fixed_yml: str) -> str:
+        """One-line description of a fix for the error history."""
+        removed: List[str] = []
+        added: List[str] = []
+        old_python: Optional[str] = None
+        new_python: Optional[str] = None
+        # unified_diff skips intraline matching and aligns inserted/removed lines, unlike a lockstep walk
+        for line in difflib.unified_diff(original_yml.splitlines(), fixed_yml.splitlines(), n=0, lineterm=""):
+            if line.startswith(("---", "+++")) or not line[1:].strip():
                 continue
-            
-            # Relax standard packages (non-pip)
-            if (is_solver_error and not in_pip_section and stripped.startswith("-") and ":" not in stripped and not stripped.startswith("- -e")):
-                indent = line[:line.find("-")]
-                pkg_line = stripped[1:].strip()
-                pkg_name = pkg_line
-                for sep in ["==", ">=", "<=", "!=", "~=", "="]:
-                    if sep in pkg_name:
-                        pkg_name = pkg_name.split(sep)[0].strip()
-                        break
-                
-                if " " in pkg_name and not pkg_name.startswith("-"):
-                    pkg_name = pkg_name.split()[0].strip()
-
-                if pkg_name:
-                    new_line = f"{indent}- {pkg_name}"
-                    fixed_lines.append(new_line)
-                    if line.strip() != new_line.strip():
-                         logger.info(f"💡 [FALLBACK] Relaxing constraint: {line.strip()} -> {pkg_name}")
-                else:
-                    fixed_lines.append(line)
+            item = line[1:].strip().lstrip("- ")
+            if line[0] == "-":
+                bucket = removed
+                if item.startswith("python="):
+                    old_python = item
+            elif line[0] == "+":
+                bucket = added
+                if item.startswith("python="):
+                    new_python = item
             else:
-                fixed_lines.append(line)
-        
-        return '\n'.join(fixed_lines)
-
-    def extract_fix_summary(self, original_yml: str, fixed_yml: str) -> str:
-        return "AI applied fixes based on error log." # Simplified for brevity
\ No newline at end of file
+                continue
+            # A Python version change explains the fix on its own
+            if old_python and new_python:
+                return f"Changed Python version: {old_python} -> {new_python}"
+            if len(bucket) < FIX_SUMMARY_MAX_ITEMS:
+                bucket.append(item)
+
+        parts = []
+        if removed:
+            parts.append(f"Removed: {', '.join(removed)}")
+        if added:
+            parts.append(f"Added: {', '.join(added)}")
+        return "; ".join(parts) if parts else "AI applied fixes based on error log."
\ No newline at end of file
@@ -4,7 +4,8 @@ Loads environment variables and API keys.
 """
 
 import os
-from typing import Optional
+from pathlib import Path
+from typing import Optional, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -17,6 +18,45 @@ class Settings:
     # Maximum number of retry attempts for fixing conda environment errors
     MAX_RETRIES: int = 8
 
+    # Models per agent; the fixer starts on the fast model and escalates after repeated failures
+    DECISION_MODEL: str = "gpt-4-turbo-preview"
+    BUILDER_MODEL: str = "gpt-4o-mini"
+    FIXER_MODEL: str = "gpt-4o-mini"
+    FIXER_ESCALATION_MODEL: str = "gpt-4-turbo-preview"
+    FIXER_ESCALATE_AFTER: int = 2  # failed fixes (Memory.error_history entries) before escalating
+    # One fix candidate is sampled per temperature, concurrently; the first that changes the YAML wins
+    FIXER_CANDIDATE_TEMPERATURES: Tuple[float, ...] = (0.2, 0.5, 0.8)
+    # Output cap for a fix answer, which is a whole environment.yml: this floor, raised to
+    # FIXER_TOKENS_PER_YML_CHAR per character of the current YAML (~2x headroom at ~4 chars/token)
+    FIXER_MAX_TOKENS: int = 1024
+    FIXER_TOKENS_PER_YML_CHAR: float = 0.5
+
+    # Share of detected imports the local resolver must map before a summary build skips the LLM
+    RESOLVER_MIN_CONFIDENCE: float = 1.0
+
+    # How long cached LLM answers stay valid (seconds)
+    DECISION_CACHE_TTL: int = 24 * 60 * 60      # 24h
+    BUILD_CACHE_TTL: int = 7 * 24 * 60 * 60     # 7d
+    FIX_CACHE_TTL: int = 7 * 24 * 60 * 60       # 7d
+
+    # Maximum concurrent LLM requests in batch mode (decide_many)
+    LLM_CONCURRENCY: int = 4
+
+    # OpenAI clients: per-request timeout (seconds) and SDK-level retries
+    # (exponential backoff with jitter on 429, 5xx, timeouts and connection errors)
+    LLM_TIMEOUT: float = 30.0
+    LLM_MAX_RETRIES: int = 3
+
+    # Opt-in semantic cache (ENVAGENT_SEMANTIC_CACHE=1): reuse a build whose summary embedding is this close
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+
+    # Projects packed into one chat request by EnvironmentBuilder.build_from_summaries
+    SUMMARY_GROUP_SIZE: int = 4
+
+    # Seconds between status checks of an OpenAI Batch API job
+    BATCH_POLL_INTERVAL: float = 30.0
+
     def __init__(self):
         """Initialize settings by loading from environment variables."""
         self.openai_api_key: Optional[str] = os.getenv("OPENAI_API_KEY")
@@ -28,6 +68,12 @@ class Settings:
                 "See .env.example for reference."
             )
 
+        # On-disk LLM response cache (set ENVAGENT_NO_LLM_CACHE=1 to disable)
+        self.llm_cache_enabled: bool = not os.getenv("ENVAGENT_NO_LLM_CACHE")
+        cache_home = os.getenv("XDG_CACHE_HOME") or os.path.join(Path.home(), ".cache")
+        self.llm_cache_dir: Path = Path(cache_home) / "envagent" / "llm"
+        self.semantic_cache_enabled: bool = bool(os.getenv("ENVAGENT_SEMANTIC_CACHE"))
+
     @property
     def api_key(self) -> str:
         """Get the OpenAI API key."""
@@ -22,6 +22,7 @@ from agents.code_scanner import CodeScannerAgent
 from agents.env_builder import EnvironmentBuilder
 from agents.env_fixer import EnvironmentFixer
 from utils.memory import Memory
+from utils.llm_cache import clear_cache
 
 # --- Setup & Helpers ---
 
@@ -39,6 +40,7 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument("-n", "--env-name", type=str, default=None, help="Conda env name")
     parser.add_argument("--python-version", type=str, default="3.9", help="Python version")
     parser.add_argument("--no-create", action="store_true", help="Skip creation")
+    parser.add_argument("--clear-cache", action="store_true", help="Discard cached LLM answers before running")
     return parser.parse_args()
 
 def validate_directory(path_str: str) -> Path:
@@ -81,6 +83,7 @@ def analyze_structure(root_path: Path) -> dict:
     
     print(f"   Decision: {decision['reason']}")
     decision['target_path_obj'] = target_dir 
+    decision['agent'] = agent  # Reused later so env files read during the scan aren't read again
     return decision
 
 def process_existing_files(decision: dict, project_name: str, py_version: str, root_path: Path, output_path: Path, system_context: dict) -> str:
@@ -90,7 +93,7 @@ def process_existing_files(decision: dict, project_name: str, py_version: str, r
     print("=" * 60)
     
     target_dir = decision['target_path_obj']
-    agent = DecisionAgent()
+    agent = decision.get('agent') or DecisionAgent()
     
     collected_content = agent.collect_env_files_content(str(target_dir))
     
@@ -156,7 +159,6 @@ def create_environment_with_retry(env_name: str, output_path: Path, initial_yml:
         executor.remove_environment(env_name)
 
     current_yml = initial_yml
-    error_history = []
     memory = Memory()
 
     for attempt in range(1, settings.MAX_RETRIES + 1):
@@ -177,7 +179,6 @@ def create_environment_with_retry(env_name: str, output_path: Path, initial_yml:
             sys.exit(1)
             
         print(f"   🔧 Applying fix...")
-        memory.error_history = error_history
 
         try:
             # Pass system_context to Fixer so it knows we are on M4
@@ -186,7 +187,7 @@ def create_environment_with_retry(env_name: str, output_path: Path, initial_yml:
             
             fix_summary = fixer.extract_fix_summary(current_yml, fixed_yml)
             current_yml = fixed_yml
-            error_history.append((error, fix_summary))
+            memory.add_error(error, fix_summary)
         except Exception as e:
             print(f"❌ Fixer crashed: {e}")
             sys.exit(1)
@@ -206,6 +207,9 @@ def main() -> None:
     root_path = validate_directory(args.source)
     output_path = Path(args.destination).resolve()
     os.makedirs(output_path.parent, exist_ok=True)
+
+    if args.clear_cache:
+        print(f"🧹 Cleared {clear_cache()} cached LLM answers")
     
     # 1. Run System Check & Capture Hardware Context
     system_context = run_system_check()
@@ -5,19 +5,18 @@ Contains utilities for file reading and memory management.
 
 from .memory import Memory
 from .conda_executor import CondaExecutor
-from .helpers import sanitize_env_name, extract_imports, map_import_to_package, IMPORT_TO_PACKAGE
+from .helpers import sanitize_env_name, strip_markdown_fences, extract_imports, map_import_to_package, IMPORT_TO_PACKAGE
 from .system_checker import SystemChecker
 from .file_filter import FileFilter
 
 __all__ = [
-    "LocalReader",
     "Memory",
     "CondaExecutor",
     "sanitize_env_name",
+    "strip_markdown_fences",
     "extract_imports",
     "map_import_to_package",
     "IMPORT_TO_PACKAGE",
     "SystemChecker",
-    "FileFilter",
-    "DependencyCollector"
+    "FileFilter"
 ]
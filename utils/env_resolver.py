@@ -0,0 +1,156 @@
+"""
+Local dependency resolution for environment.yml generation.
+Mirrors the deterministic part of the build prompts (import -> package -> conda name,
+conda vs pip placement, channel order) so the common case needs no LLM call.
+"""
+
+import logging
+from typing import List, Optional, Tuple
+
+from .helpers import IMPORT_TO_PACKAGE
+
+logger = logging.getLogger(__name__)
+
+# pip name (lowercase) -> conda name; mirrors the mapping rules in the build prompts
+PIP_TO_CONDA = {
+    "torch": "pytorch",
+    "opencv-python": "opencv",
+    "opencv-python-headless": "opencv",
+    "opencv-contrib-python": "opencv",
+    "tensorflow-gpu": "tensorflow",
+    "face-recognition": "face_recognition",  # conda-forge keeps the underscore; conda doesn't equate - and _
+}
+
+# Compiled packages kept in the conda section (BINARY PREFERENCE rule), by conda name; everything else goes to pip
+CONDA_PREFERRED = frozenset({
+    "numpy", "pandas", "scipy", "scikit-learn", "scikit-image", "pillow", "dlib", "face_recognition",
+    "pytorch", "torchvision", "torchaudio", "opencv", "tensorflow", "matplotlib", "h5py",
+})
+
+# Conda builds whose versions don't follow the pip ones (or must stay unpinned), so pins are dropped
+CONDA_UNPINNED = frozenset({"opencv", "dlib"})
+
+# Packages served from the `pytorch` channel
+PYTORCH_CHANNEL_PACKAGES = frozenset({"pytorch", "torchvision", "torchaudio"})
+
+_IMPORTS_HEADER = "## Detected Third-Party Imports"
+_HINTS_HEADER = "## Configuration File Hints:"
+_NO_HINTS = "(No configuration files found)"
+
+
+def to_conda_name(pip_name: str) -> str:
+    """
+    Translate a pip distribution name into its conda package name.
+
+    Args:
+        pip_name: Package name as used by pip (any case)
+
+    Returns:
+        The conda package name
+    """
+    name = pip_name.lower().replace("_", "-")
+    return PIP_TO_CONDA.get(name, name)
+
+
+def render_environment_yml(env_name: str, python_version: str, conda_deps: List[str], pip_deps: List[str]) -> str:
+    """
+    Render an environment.yml in the layout of the build prompts' example output.
+
+    Args:
+        env_name: Sanitized environment name
+        python_version: Target Python version (e.g. "3.10")
+        conda_deps: Conda match specs, in order
+        pip_deps: pip requirement strings, in order
+
+    Returns:
+        environment.yml text
+    """
+    channels = ["conda-forge"]
+    if any(dep.split("=", 1)[0].split("<", 1)[0].split(">", 1)[0] in PYTORCH_CHANNEL_PACKAGES for dep in conda_deps):
+        channels.append("pytorch")
+    channels.append("defaults")
+
+    lines = [f"name: {env_name}", "channels:"]
+    lines.extend(f"  - {ch}" for ch in channels)
+    lines.append("dependencies:")
+    lines.append(f"  - python={python_version}")
+    lines.extend(f"  - {dep}" for dep in conda_deps)
+    lines.append("  - pip")
+    if pip_deps:
+        lines.append("  - pip:")
+        lines.extend(f"      - {dep}" for dep in pip_deps)
+    return "\n".join(lines) + "\n"
+
+
+class DependencyResolver:
+    """Resolves a CodeScanner dependency summary into a draft environment.yml without the LLM."""
+
+    def resolve(self, summary_content: str, env_name: str, python_version: str, cuda_required: bool) -> Tuple[Optional[str], float]:
+        """
+        Build a draft environment.yml from a dependency summary.
+
+        Args:
+            summary_content: Text written by CodeScannerAgent
+            env_name: Sanitized environment name
+            python_version: Target Python version
+            cuda_required: Whether CUDA packages are needed
+
+        Returns:
+            (yaml, confidence): confidence is the share of imports the tables resolve;
+            0.0 (and no YAML) when config-file hints or CUDA call for the LLM's judgement
+        """
+        imports, has_hints = self._parse_summary(summary_content)
+        if has_hints or cuda_required:
+            return None, 0.0
+
+        known = [imp for imp in imports if imp in IMPORT_TO_PACKAGE]
+        confidence = len(known) / len(imports) if imports else 1.0
+        if len(known) < len(imports):
+            # Unknown names may be local modules or packages with unusual names; only the LLM can tell
+            return None, confidence
+
+        conda_deps: List[str] = []
+        pip_deps: List[str] = []
+        seen = set()
+        for imp in known:
+            package = IMPORT_TO_PACKAGE[imp]
+            conda_name = to_conda_name(package)
+            if conda_name in seen:
+                continue
+            seen.add(conda_name)
+            if conda_name in CONDA_PREFERRED:
+                conda_deps.append(conda_name)
+            else:
+                pip_deps.append(package)
+
+        return render_environment_yml(env_name, python_version, conda_deps, pip_deps), confidence
+
+    def detected_imports(self, summary_content: str) -> List[str]:
+        """Imports listed in a CodeScanner summary, in summary order."""
+        return self._parse_summary(summary_content)[0]
+
+    def config_hints(self, summary_content: str) -> str:
+        """Raw configuration-file hint section of a summary (pins live here); "" when there is none."""
+        start = summary_content.find(_HINTS_HEADER)
+        if start < 0:
+            return ""
+        hints = summary_content[start + len(_HINTS_HEADER):].strip()
+        return "" if hints == _NO_HINTS else hints
+
+    def _parse_summary(self, summary_content: str) -> Tuple[List[str], bool]:
+        """Returns (imports in summary order, whether config-file hints are present)."""
+        imports: List[str] = []
+        section = None
+        has_hints = False
+        for raw in summary_content.splitlines():
+            line = raw.strip()
+            if line.startswith("## "):
+                section = "imports" if line.startswith(_IMPORTS_HEADER) else "hints" if line == _HINTS_HEADER else None
+                continue
+            if not line:
+                continue
+            if section == "imports" and line.startswith("- "):
+                imports.append(line[2:].strip())
+            elif section == "hints" and line != _NO_HINTS:
+                has_hints = True
+        return imports, has_hints
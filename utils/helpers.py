@@ -2,10 +2,12 @@
 Helper utility functions for EnvAgent.
 """
 
+import functools
 import re
 from typing import Set
 
 
+@functools.lru_cache(maxsize=512)
 def sanitize_env_name(name: str) -> str:
     """
     Convert project name to valid conda environment name.
@@ -61,6 +63,31 @@ def sanitize_env_name(name: str) -> str:
     return name
 
 
+def strip_markdown_fences(text: str) -> str:
+    """
+    Extract the body of a ```-fenced block from an LLM answer.
+
+    Everything before the first fence line and from the last fence on is dropped;
+    text without fences is returned stripped. Works by find/rfind slicing, so no
+    line lists are built.
+
+    Args:
+        text: Raw model output
+
+    Returns:
+        The fenced body (or the whole text), stripped
+    """
+    text = text.strip()
+    first = text.find("```")
+    if first == -1:
+        return text
+    start = text.find("\n", first) + 1
+    if start == 0:
+        return ""
+    end = text.rfind("```")
+    return text[start:end].strip() if end > start else text[start:].strip()
+
+
 # Import name to package name mapping
 IMPORT_TO_PACKAGE = {
     # Common mismatches between import name and package name
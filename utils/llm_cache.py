@@ -0,0 +1,245 @@
+"""
+Persistent cache for LLM chat completions.
+Identical requests (same model, messages and sampling params) are answered from an
+in-process LRU or from disk instead of making another round trip to the API.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from config.settings import settings
+from .semantic_cache import clear_similar
+
+logger = logging.getLogger(__name__)
+
+# Request fields that influence the completion and therefore belong in the key
+# (`stream` only changes the transport, so streamed and plain calls share entries)
+KEY_FIELDS = ("model", "messages", "temperature", "seed", "response_format", "max_tokens")
+
+class TruncatedCompletionError(RuntimeError):
+    """The model stopped at max_tokens (finish_reason == "length"); the answer is incomplete."""
+
+
+# In-process layer in front of the disk: key -> (created, content)
+MEMORY_CACHE_SIZE = 128
+_memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def cache_key(**request: Any) -> str:
+    """
+    Build a stable key for a chat completion request.
+
+    Args:
+        **request: Keyword arguments as passed to client.chat.completions.create
+
+    Returns:
+        Hex sha256 digest of the request fields that affect the output
+    """
+    payload = {name: request.get(name) for name in KEY_FIELDS}
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def cached_chat(client: Any, *, ttl: float, **request: Any) -> str:
+    """
+    Call client.chat.completions.create, reusing a cached answer when one is fresh.
+
+    Args:
+        client: OpenAI client
+        ttl: Seconds a cached answer stays valid
+        **request: Arguments for chat.completions.create
+
+    Returns:
+        The message content of the first choice
+    """
+    if not settings.llm_cache_enabled:
+        return _create(client, request)
+
+    key = cache_key(**request)
+    content = _lookup(key, ttl)
+    if content is not None:
+        return content
+
+    content = _create(client, request)
+    if content:
+        _remember(key, request.get("model"), content)
+    return content
+
+
+async def acached_chat(aclient: Any, *, ttl: float, **request: Any) -> str:
+    """
+    Async counterpart of cached_chat() for an AsyncOpenAI client.
+    Cache lookups are small local file reads and stay synchronous.
+
+    Args:
+        aclient: AsyncOpenAI client
+        ttl: Seconds a cached answer stays valid
+        **request: Arguments for chat.completions.create
+
+    Returns:
+        The message content of the first choice
+    """
+    if not settings.llm_cache_enabled:
+        return await _acreate(aclient, request)
+
+    key = cache_key(**request)
+    content = _lookup(key, ttl)
+    if content is not None:
+        return content
+
+    content = await _acreate(aclient, request)
+    if content:
+        _remember(key, request.get("model"), content)
+    return content
+
+
+def get_cached(*, ttl: float, **request: Any) -> Optional[str]:
+    """
+    Look up a cached answer without calling the API (e.g. before submitting a batch).
+
+    Args:
+        ttl: Seconds a cached answer stays valid
+        **request: Arguments for chat.completions.create
+
+    Returns:
+        The cached content, or None on a miss or when caching is disabled
+    """
+    if not settings.llm_cache_enabled:
+        return None
+    return _lookup(cache_key(**request), ttl)
+
+
+def put_cached(content: str, **request: Any) -> None:
+    """Store an answer obtained outside cached_chat() (e.g. from a batch job)."""
+    if settings.llm_cache_enabled and content:
+        _remember(cache_key(**request), request.get("model"), content)
+
+
+def clear_cache() -> int:
+    """
+    Drop every cached answer, in memory and on disk (e.g. after a bad fix was cached),
+    including the semantic cache's reusable builds.
+
+    Returns:
+        Number of disk entries removed
+    """
+    removed = clear_similar()
+    with _memory_lock:
+        _memory.clear()
+    for cache_file in settings.llm_cache_dir.glob("*.json"):
+        try:
+            cache_file.unlink()
+            removed += 1
+        except OSError as e:
+            logger.debug(f"Could not remove LLM cache entry {cache_file.name}: {e}")
+    return removed
+
+
+def _create(client: Any, request: dict) -> str:
+    response = client.chat.completions.create(**request)
+    if request.get("stream"):
+        # Deltas are collected as they arrive instead of waiting for the whole body
+        parts = []
+        finish_reason = None
+        for chunk in response:
+            finish_reason = _collect_chunk(chunk, parts) or finish_reason
+        return _finished("".join(parts), finish_reason)
+    choice = response.choices[0]
+    return _finished(choice.message.content or "", choice.finish_reason)
+
+
+async def _acreate(aclient: Any, request: dict) -> str:
+    response = await aclient.chat.completions.create(**request)
+    if request.get("stream"):
+        parts = []
+        finish_reason = None
+        async for chunk in response:
+            finish_reason = _collect_chunk(chunk, parts) or finish_reason
+        return _finished("".join(parts), finish_reason)
+    choice = response.choices[0]
+    return _finished(choice.message.content or "", choice.finish_reason)
+
+
+def _collect_chunk(chunk: Any, parts: list) -> Optional[str]:
+    """Appends the chunk's text; returns its finish_reason (set on the last chunk only)."""
+    if not chunk.choices:
+        return None
+    choice = chunk.choices[0]
+    parts.append(choice.delta.content or "")
+    return choice.finish_reason
+
+
+def _finished(content: str, finish_reason: Optional[str]) -> str:
+    """Raises on an answer cut off by max_tokens, so it is never cached or used as complete."""
+    if finish_reason == "length":
+        raise TruncatedCompletionError(f"completion hit max_tokens after {len(content)} characters")
+    return content
+
+
+def _lookup(key: str, ttl: float) -> Optional[str]:
+    """Memory first, then disk; a fresh disk entry is promoted into memory."""
+    now = time.time()
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _memory.move_to_end(key)
+    if entry is not None and now - entry[0] <= ttl:
+        logger.info(f"⚡ LLM cache hit ({key[:12]}, memory)")
+        return entry[1]
+
+    cache_file = settings.llm_cache_dir / f"{key}.json"
+    entry = _load(cache_file)
+    if entry is None or now - entry[0] > ttl:
+        return None
+
+    _remember_in_memory(key, *entry)
+    logger.info(f"⚡ LLM cache hit ({key[:12]})")
+    return entry[1]
+
+
+def _remember(key: str, model: Optional[str], content: str) -> None:
+    created = time.time()
+    _remember_in_memory(key, created, content)
+    _store(settings.llm_cache_dir / f"{key}.json", model, content, created)
+
+
+def _remember_in_memory(key: str, created: float, content: str) -> None:
+    with _memory_lock:
+        _memory[key] = (created, content)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def _load(cache_file: Path) -> Optional[Tuple[float, str]]:
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    content = entry.get("content")
+    if content is None:
+        return None
+    return entry.get("created", 0), content
+
+
+def _store(cache_file: Path, model: Optional[str], content: str, created: float) -> None:
+    """Writes via a temp file + rename so a concurrent reader never sees a partial entry."""
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"created": created, "model": model, "content": content}, f)
+        os.replace(tmp_path, cache_file)
+    except OSError as e:
+        logger.debug(f"Could not write LLM cache entry {cache_file.name}: {e}")
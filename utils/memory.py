@@ -2,8 +2,13 @@
 Memory dataclass for storing analysis results between agents.
 """
 
+from collections import deque
 from dataclasses import dataclass, field
-from typing import List, Optional, Tuple
+from typing import Deque, List, Optional, Tuple
+
+# Only the most recent fix attempts go back into the fixer prompt, so its size stays bounded
+MAX_ERROR_HISTORY = 3
+ERROR_SNIPPET_CHARS = 300
 
 
 @dataclass
@@ -20,7 +25,13 @@ class Memory:
     cudnn_version: Optional[str] = None
     system_dependencies: List[str] = field(default_factory=list)
     raw_analysis: str = ""
-    error_history: List[Tuple[str, str]] = field(default_factory=list)  # (error, fix_description)
+    error_history: Deque[Tuple[str, str]] = field(
+        default_factory=lambda: deque(maxlen=MAX_ERROR_HISTORY)
+    )  # (error snippet, fix_description), newest last
+
+    def add_error(self, error: str, fix_description: str) -> None:
+        """Record a failed attempt; the error is trimmed to its snippet once, here."""
+        self.error_history.append((error[:ERROR_SNIPPET_CHARS], fix_description))
 
     def __repr__(self) -> str:
         """Return a string representation of the Memory."""
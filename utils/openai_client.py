@@ -0,0 +1,127 @@
+"""
+Shared OpenAI client for the agents.
+A single client keeps one httpx connection pool, so TLS sessions and keep-alive
+connections are reused across agents and calls instead of being rebuilt per agent.
+"""
+
+import importlib.util
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Terminal states of an OpenAI batch job
+BATCH_DONE_STATES = frozenset({"completed", "failed", "expired", "cancelled"})
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """
+    Return the process-wide OpenAI client, creating it on first use.
+    Double-checked locking: after creation the fast path is a plain read, and threads racing
+    on the first call build only one client (and one connection pool).
+
+    Returns:
+        openai.OpenAI instance backed by a keep-alive httpx pool
+    """
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            _client = _create_openai_client()
+    return _client
+
+
+def _create_openai_client():
+    import httpx
+    from openai import OpenAI
+
+    # HTTP/2 multiplexes concurrent requests over one connection; it needs the optional `h2` package
+    http2 = importlib.util.find_spec("h2") is not None
+    return OpenAI(
+        api_key=settings.api_key,
+        max_retries=settings.LLM_MAX_RETRIES,
+        timeout=settings.LLM_TIMEOUT,
+        http_client=httpx.Client(
+            http2=http2,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        ),
+    )
+
+
+def new_async_openai_client():
+    """
+    Create an AsyncOpenAI client with the same timeout and retry policy as the shared sync client.
+    Not cached: an async client's connection pool belongs to the event loop it is first used on.
+
+    Returns:
+        openai.AsyncOpenAI instance
+    """
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(
+        api_key=settings.api_key,
+        max_retries=settings.LLM_MAX_RETRIES,
+        timeout=settings.LLM_TIMEOUT,
+    )
+
+
+def run_chat_batch(client: Any, requests: List[Dict[str, Any]], poll_interval: Optional[float] = None) -> List[Optional[str]]:
+    """
+    Run chat completions through the OpenAI Batch API (half price, up to 24h turnaround).
+
+    Args:
+        client: OpenAI client
+        requests: chat.completions.create arguments, one dict per completion
+        poll_interval: Seconds between status checks (defaults to settings.BATCH_POLL_INTERVAL)
+
+    Returns:
+        Message contents in the order of requests; None where a request failed
+    """
+    if not requests:
+        return []
+    poll_interval = poll_interval or settings.BATCH_POLL_INTERVAL
+
+    lines = [
+        json.dumps({"custom_id": str(i), "method": "POST", "url": "/v1/chat/completions", "body": body})
+        for i, body in enumerate(requests)
+    ]
+    batch_file = client.files.create(file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    logger.info(f"📦 Submitted batch {batch.id} with {len(requests)} requests")
+
+    while batch.status not in BATCH_DONE_STATES:
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+
+    results: List[Optional[str]] = [None] * len(requests)
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        if response.get("status_code") != 200:
+            logger.warning(f"Batch request {record.get('custom_id')} failed: {record.get('error')}")
+            continue
+        choice = response["body"]["choices"][0]
+        if choice.get("finish_reason") == "length":
+            logger.warning(f"Batch request {record.get('custom_id')} hit max_tokens; discarding the truncated answer")
+            continue
+        results[int(record["custom_id"])] = choice["message"]["content"]
+    return results
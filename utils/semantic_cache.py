@@ -0,0 +1,144 @@
+"""
+Embedding-based cache for near-duplicate LLM inputs.
+Two repos whose dependency summaries differ only slightly produce essentially the same
+environment.yml; instead of another chat completion, a cheap embedding call finds a
+previous answer whose input is close enough (cosine similarity >= threshold).
+"""
+
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import settings
+
+try:
+    import numpy as np
+except ImportError:  # plain-Python dot products are fine for the cache sizes we keep
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# scope -> [(created, unit vector, content)], loaded lazily from disk
+_entries: Dict[str, List[Tuple[float, List[float], str]]] = {}
+_entries_lock = threading.Lock()
+
+
+def embed_text(client: Any, text: str) -> List[float]:
+    """
+    Embed text and normalize it to unit length, so cosine similarity is a plain dot product.
+
+    Args:
+        client: OpenAI client
+        text: Input to embed
+
+    Returns:
+        Unit-length embedding vector
+    """
+    response = client.embeddings.create(model=settings.EMBEDDING_MODEL, input=text)
+    vector = response.data[0].embedding
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def find_similar(scope: str, vector: List[float], ttl: float) -> Optional[str]:
+    """
+    Return the cached content whose input is most similar to vector, if it clears the threshold.
+
+    Args:
+        scope: Partition key; only entries stored under the same scope are compared
+        vector: Unit-length embedding from embed_text()
+        ttl: Seconds an entry stays valid
+
+    Returns:
+        The cached content, or None when nothing is similar enough
+    """
+    now = time.time()
+    entries = [e for e in _scope_entries(scope) if now - e[0] <= ttl]
+    if not entries:
+        return None
+
+    if np is not None:
+        scores = np.asarray([e[1] for e in entries]) @ np.asarray(vector)
+        best = int(scores.argmax())
+        score = float(scores[best])
+    else:
+        scores = [sum(a * b for a, b in zip(e[1], vector)) for e in entries]
+        best = max(range(len(scores)), key=scores.__getitem__)
+        score = scores[best]
+
+    if score < settings.SEMANTIC_CACHE_THRESHOLD:
+        return None
+    logger.info(f"⚡ Semantic cache hit (similarity {score:.3f})")
+    return entries[best][2]
+
+
+def remember_similar(scope: str, vector: List[float], content: str) -> None:
+    """Store content under scope so later near-duplicate inputs can reuse it."""
+    if not content:
+        return
+    entry = (time.time(), vector, content)
+    with _entries_lock:
+        _scope_entries_locked(scope).append(entry)
+    try:
+        path = _scope_file(scope)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"created": entry[0], "vector": vector, "content": content}) + "\n")
+    except OSError as e:
+        logger.debug(f"Could not write semantic cache entry: {e}")
+
+
+def clear_similar() -> int:
+    """
+    Drop every semantic-cache entry, in memory and on disk.
+
+    Returns:
+        Number of scope files removed
+    """
+    with _entries_lock:
+        _entries.clear()
+    removed = 0
+    for path in (settings.llm_cache_dir.parent / "semantic").glob("*.jsonl"):
+        try:
+            path.unlink()
+            removed += 1
+        except OSError as e:
+            logger.debug(f"Could not remove semantic cache file {path.name}: {e}")
+    return removed
+
+
+def _scope_entries(scope: str) -> List[Tuple[float, List[float], str]]:
+    with _entries_lock:
+        return list(_scope_entries_locked(scope))
+
+
+def _scope_entries_locked(scope: str) -> List[Tuple[float, List[float], str]]:
+    entries = _entries.get(scope)
+    if entries is None:
+        entries = _entries[scope] = _load(_scope_file(scope))
+    return entries
+
+
+def _scope_file(scope: str) -> Path:
+    digest = hashlib.sha256(scope.encode("utf-8")).hexdigest()
+    return settings.llm_cache_dir.parent / "semantic" / f"{digest}.jsonl"
+
+
+def _load(path: Path) -> List[Tuple[float, List[float], str]]:
+    entries = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    entries.append((entry["created"], entry["vector"], entry["content"]))
+                except (ValueError, KeyError):
+                    continue  # torn write from a concurrent process
+    except OSError:
+        pass
+    return entries